@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.routes import auth, users, courses, quizzes, subscriptions, uploads
+from app.api.v1.routes import auth, users, courses, quizzes, subscriptions, uploads, files
 from app.api.v1.routes import admin_route
 
 api_router = APIRouter()
@@ -10,4 +10,5 @@ api_router.include_router(courses.router, prefix="/courses", tags=["courses"])
 api_router.include_router(quizzes.router, prefix="/quizzes", tags=["quizzes"])
 api_router.include_router(subscriptions.router, prefix="/subscription", tags=["subscription"])
 api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
+api_router.include_router(files.router, prefix="/files", tags=["files"])
 api_router.include_router(admin_route.router, prefix="/admin", tags=["admin"])
\ No newline at end of file
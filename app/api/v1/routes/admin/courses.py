@@ -6,6 +6,9 @@ from datetime import datetime
 from app.db.deps import get_db
 from app.models.course import Course, CourseCategory
 from app.schemas.course import CourseOut, CourseCreate, CourseUpdate
+from app.services.catalog import course_catalog, course_counts
+from app.services.course_media import course_media
+from app.services.response_cache import response_cache
 
 router = APIRouter()
 
@@ -62,6 +65,9 @@ def create_course(course_in: CourseCreate, db: Session = Depends(get_db)):
         db.add(course)
         db.commit()
         db.refresh(course)
+        course_catalog.upsert(course)
+        response_cache.invalidate_tags("courses", f"course:{course.id}")
+        course_counts.clear()
 
         # attach category_name dynamically
         course.category_name = category.name if category else None
@@ -131,6 +137,9 @@ def update_course(course_id: int, course_in: CourseUpdate, db: Session = Depends
         db.add(course)
         db.commit()
         db.refresh(course)
+        course_catalog.upsert(course)
+        response_cache.invalidate_tags("courses", f"course:{course.id}")
+        course_counts.clear()
 
         # Attach category name
         if course.category_id:
@@ -161,6 +170,10 @@ def delete_course(course_id: int, db: Session = Depends(get_db)):
 
         db.delete(course)
         db.commit()
+        course_catalog.remove(course_id)
+        course_media.remove(course_id)
+        response_cache.invalidate_tags("courses", f"course:{course_id}")
+        course_counts.clear()
 
         return {"message": f"Course with id {course_id} deleted successfully"}
     except Exception as e:
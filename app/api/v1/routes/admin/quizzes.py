@@ -1,20 +1,156 @@
-from fastapi import APIRouter, Depends, HTTPException, Path
+import csv
+import logging
+import time
+from collections.abc import AsyncIterator, Sequence
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import func, insert
 from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import SQLAlchemyError
+from app.core.config import settings
 from app.db.deps import get_db
 from app.models.quiz import Quiz, QuizQuestion, QuizQuestionOption
-from app.schemas.quiz import QuizCreate, QuizOut, QuizUpdate, QuizDeleteResponse
-from typing import List
+from app.schemas.quiz import (
+    QuizCreate,
+    QuizOut,
+    QuizUpdate,
+    QuizDeleteResponse,
+    QuestionCreate,
+    OptionCreate,
+    QuizImportChunkOut,
+    QuizImportOut,
+)
+from app.services.answer_keys import answer_key_cache
+from app.services.response_cache import response_cache
+from app.services.user_stats import forget_quiz_passes_stmt
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Status of the hidden quiz a replacing import writes into before the swap
+IMPORT_STAGING_STATUS = "importing"
 
 router = APIRouter()
 
 
+def insert_questions(db: Session, quiz_id: int, questions: Sequence[QuestionCreate], start_sort_order: int = 0) -> int:
+    """Insert questions, then all of their options, as two batched statements.
+
+    Question IDs come back from a single multi-row INSERT ... RETURNING in
+    parameter order, so no per-question flush is needed. Returns the number
+    of options written.
+    """
+    if not questions:
+        return 0
+    question_ids = db.scalars(
+        insert(QuizQuestion).returning(QuizQuestion.id, sort_by_parameter_order=True),
+        [
+            {
+                "quiz_id": quiz_id,
+                "question_text": q.question_text,
+                "question_type": q.question_type,
+                "sort_order": start_sort_order + i,
+            }
+            for i, q in enumerate(questions)
+        ],
+    ).all()
+    option_rows = [
+        {
+            "question_id": question_id,
+            "option_text": opt.option_text,
+            "is_correct": opt.is_correct,
+            "sort_order": j,
+        }
+        for question_id, q in zip(question_ids, questions)
+        for j, opt in enumerate(q.options)
+    ]
+    if option_rows:
+        db.execute(insert(QuizQuestionOption), option_rows)
+    return len(option_rows)
+
+
+def delete_questions(db: Session, quiz_id: int) -> None:
+    """Bulk-delete a quiz's questions and options.
+
+    Recorded answers are kept; their question/option references become NULL
+    (ON DELETE SET NULL), while the attempt and its is_correct flags stay.
+    """
+    question_ids = db.query(QuizQuestion.id).filter(QuizQuestion.quiz_id == quiz_id)
+    db.query(QuizQuestionOption).filter(QuizQuestionOption.question_id.in_(question_ids)).delete(synchronize_session=False)
+    db.query(QuizQuestion).filter(QuizQuestion.quiz_id == quiz_id).delete(synchronize_session=False)
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[str]:
+    # A line never completes without a newline, so cap it to keep memory bounded
+    max_bytes = settings.quiz_import_max_line_bytes
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if len(line) > max_bytes:
+                raise ValueError(f"line longer than {max_bytes} bytes")
+            yield line.decode("utf-8").rstrip("\r")
+        if len(buffer) > max_bytes:
+            raise ValueError(f"line longer than {max_bytes} bytes")
+    if buffer:
+        yield buffer.decode("utf-8").rstrip("\r")
+
+
+async def _iter_ndjson_questions(request: Request) -> AsyncIterator[QuestionCreate]:
+    lineno = 0
+    async for line in _iter_lines(request):
+        lineno += 1
+        if not line.strip():
+            continue
+        try:
+            yield QuestionCreate.model_validate_json(line)
+        except ValidationError as e:
+            raise ValueError(f"line {lineno}: {e}")
+
+
+async def _iter_csv_questions(request: Request) -> AsyncIterator[QuestionCreate]:
+    # Columns: question_text, question_type, options ("|"-separated),
+    # correct (1-based "|"-separated option indexes). A record may span
+    # several physical lines while a quoted field is still open.
+    header = None
+    pending = ""
+    async for line in _iter_lines(request):
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        row = next(csv.reader([record]))
+        if header is None:
+            header = [h.strip() for h in row]
+            continue
+        data = dict(zip(header, row))
+        try:
+            option_texts = [o for o in data.get("options", "").split("|") if o != ""]
+            correct = {int(i) for i in data.get("correct", "").split("|") if i.strip()}
+            yield QuestionCreate(
+                question_text=data.get("question_text", ""),
+                question_type=data.get("question_type") or "multiple_choice",
+                options=[
+                    OptionCreate(option_text=text, is_correct=(i + 1) in correct)
+                    for i, text in enumerate(option_texts)
+                ],
+            )
+        except (ValueError, ValidationError) as e:
+            raise ValueError(f"row {record[:80]!r}: {e}")
+
+
 @router.get("", response_model=List[QuizOut], status_code=201)
 def get_quiz(db: Session = Depends(get_db)):
     try:
         quizzes = (
             db.query(Quiz)
             .options(selectinload(Quiz.questions).selectinload(QuizQuestion.options))
+            .filter(Quiz.status != IMPORT_STAGING_STATUS)
             .all()
         )
         return quizzes
@@ -43,25 +179,11 @@ def create_quiz(quiz_in: QuizCreate, db: Session = Depends(get_db)):
         db.add(quiz)
         db.flush()  # so we get quiz.id before commit
 
-        # Create questions & options
-        for q in quiz_in.questions:
-            question = QuizQuestion(
-                quiz_id=quiz.id,
-                question_text=q.question_text,
-                question_type=q.question_type,
-            )
-            db.add(question)
-            db.flush()
-
-            for opt in q.options:
-                option = QuizQuestionOption(
-                    question_id=question.id,
-                    option_text=opt.option_text,
-                    is_correct=opt.is_correct,
-                )
-                db.add(option)
+        # Create questions & options (batched; IDs come back via RETURNING)
+        insert_questions(db, quiz.id, quiz_in.questions)
 
         db.commit()
+        response_cache.invalidate_tags("quizzes")
 
         # Reload with relationships for response serialization
         quiz = (
@@ -101,32 +223,16 @@ def update_quiz(
 
         # Handle questions replacement if provided
         if quiz_in.questions is not None:
-            # Delete old questions & options
-            db.query(QuizQuestionOption).filter(QuizQuestionOption.question_id.in_(
-                db.query(QuizQuestion.id).filter(QuizQuestion.quiz_id == quiz.id)
-            )).delete(synchronize_session=False)
-            db.query(QuizQuestion).filter(QuizQuestion.quiz_id == quiz.id).delete(synchronize_session=False)
+            # Delete old questions & options (and answers recorded against them)
+            delete_questions(db, quiz.id)
             db.flush()
 
             # Insert new questions & options
-            for q in quiz_in.questions:
-                question = QuizQuestion(
-                    quiz_id=quiz.id,
-                    question_text=q.question_text,
-                    question_type=q.question_type,
-                )
-                db.add(question)
-                db.flush()
-
-                for opt in q.options:
-                    option = QuizQuestionOption(
-                        question_id=question.id,
-                        option_text=opt.option_text,
-                        is_correct=opt.is_correct,
-                    )
-                    db.add(option)
+            insert_questions(db, quiz.id, quiz_in.questions)
 
         db.commit()
+        response_cache.invalidate_tags("quizzes")
+        answer_key_cache.invalidate(quiz_id)
         
         # Reload with relationships for response serialization
         quiz = (
@@ -160,9 +266,15 @@ def delete_quiz(
         if not quiz:
             raise HTTPException(status_code=404, detail="クイズが見つかりません")
         
+        # Attempts and answers are kept (their references become NULL); only the
+        # quiz's passes leave the learners' stats, matching rebuild-user-stats
+        db.execute(forget_quiz_passes_stmt(quiz_id))
+
         # Delete quiz (cascade will handle questions and options due to relationships)
         db.delete(quiz)
         db.commit()
+        response_cache.invalidate_tags("quizzes")
+        answer_key_cache.invalidate(quiz_id)
 
         return QuizDeleteResponse(message="クイズ削除成功")
     except Exception as e:
@@ -174,4 +286,122 @@ def delete_quiz(
                 "status": "failed",
                 "error": str(e),
             }
-        )
\ No newline at end of file
+        )
+
+
+@router.post("/{quiz_id}/import", response_model=QuizImportOut, summary="問題バンク一括インポート（管理者用）")
+async def import_questions(
+    request: Request,
+    quiz_id: int = Path(..., description="クイズID"),
+    replace: bool = Query(False, description="既存の問題を削除してから取り込む"),
+    db: Session = Depends(get_db),
+):
+    """Stream an NDJSON (one QuestionCreate per line) or CSV question bank.
+
+    The body is parsed incrementally and written in chunks of
+    ``quiz_import_chunk_size`` questions, each committed on its own, so memory
+    stays bounded by the chunk size regardless of upload size. With
+    ``replace`` the chunks go to a hidden staging quiz whose questions replace
+    the live ones in a single transaction at the end, so a failed import
+    leaves the quiz untouched.
+    """
+    content_type = request.headers.get("content-type", "")
+    parse = _iter_csv_questions if "csv" in content_type else _iter_ndjson_questions
+    chunk_size = settings.quiz_import_chunk_size
+    chunks: List[QuizImportChunkOut] = []
+    staging_id: Optional[int] = None
+
+    def invalidate() -> None:
+        response_cache.invalidate_tags("quizzes")
+        answer_key_cache.invalidate(quiz_id)
+
+    def prepare() -> int:
+        nonlocal staging_id
+        quiz = db.get(Quiz, quiz_id)
+        if not quiz:
+            raise HTTPException(status_code=404, detail="クイズが見つかりません")
+        if replace:
+            staging = Quiz(course_id=quiz.course_id, title=quiz.title, status=IMPORT_STAGING_STATUS)
+            db.add(staging)
+            db.commit()
+            staging_id = staging.id
+            return 0
+        return db.query(func.coalesce(func.max(QuizQuestion.sort_order) + 1, 0)).filter(
+            QuizQuestion.quiz_id == quiz_id
+        ).scalar()
+
+    def write_chunk(batch: List[QuestionCreate], start_sort_order: int) -> int:
+        options = insert_questions(db, staging_id or quiz_id, batch, start_sort_order)
+        db.commit()
+        if staging_id is None:
+            invalidate()  # appended questions are live as soon as they commit
+        return options
+
+    def swap() -> None:
+        delete_questions(db, quiz_id)
+        db.query(QuizQuestion).filter(QuizQuestion.quiz_id == staging_id).update(
+            {QuizQuestion.quiz_id: quiz_id}, synchronize_session=False
+        )
+        db.query(Quiz).filter(Quiz.id == staging_id).delete(synchronize_session=False)
+        db.commit()
+        invalidate()
+
+    def discard() -> None:
+        db.rollback()
+        delete_questions(db, staging_id)
+        db.query(Quiz).filter(Quiz.id == staging_id).delete(synchronize_session=False)
+        db.commit()
+
+    async def flush(batch: List[QuestionCreate], sort_order: int) -> None:
+        started = time.perf_counter()
+        options = await run_in_threadpool(write_chunk, batch, sort_order)
+        chunk = QuizImportChunkOut(
+            chunk=len(chunks) + 1,
+            questions=len(batch),
+            options=options,
+            elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+        )
+        chunks.append(chunk)
+        logger.info("quiz %d import chunk %d: %d questions, %d options in %.1f ms",
+                    quiz_id, chunk.chunk, chunk.questions, chunk.options, chunk.elapsed_ms)
+
+    try:
+        sort_order = await run_in_threadpool(prepare)
+        batch: List[QuestionCreate] = []
+        async for question in parse(request):
+            batch.append(question)
+            if len(batch) >= chunk_size:
+                await flush(batch, sort_order)
+                sort_order += len(batch)
+                batch = []
+        if batch:
+            await flush(batch, sort_order)
+        if staging_id is not None:
+            await run_in_threadpool(swap)
+    except Exception as e:
+        await run_in_threadpool(db.rollback)
+        if staging_id is not None:
+            try:
+                await run_in_threadpool(discard)
+            except Exception:
+                logger.exception("quiz %d import: could not remove staging quiz %d", quiz_id, staging_id)
+            chunks = []  # nothing of a replacing import went live
+        if isinstance(e, HTTPException):
+            raise
+        # Earlier chunks of an appending import are already committed; report how far we got
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+                "chunks_committed": len(chunks),
+                "questions_committed": sum(c.questions for c in chunks),
+            }
+        )
+
+    return QuizImportOut(
+        quiz_id=quiz_id,
+        total_questions=sum(c.questions for c in chunks),
+        total_options=sum(c.options for c in chunks),
+        chunks=chunks,
+    )
@@ -11,6 +11,8 @@ from app.models.purchase import CoursePurchase
 from app.models.subscription_plan import UserSubscription
 from app.schemas.admin import UserListResponse, PaginationMeta
 from app.schemas.user import UserOut, UserUpdate
+from app.services.principal_cache import principal_cache
+from app.services.revocation import revoke_user_tokens, token_denylist
 
 router = APIRouter()
 
@@ -120,11 +122,16 @@ def update_user(
             user.name = payload.name
         if payload.email is not None:
             user.email = payload.email
+        revoked = []
         if payload.is_active is not None:
+            if user.is_active and not payload.is_active:
+                revoked = revoke_user_tokens(db, user.id)
             user.is_active = payload.is_active
 
         db.commit()
         db.refresh(user)
+        principal_cache.invalidate(user.id)
+        token_denylist.add_many(revoked)
         return user
     except Exception as e:
         db.rollback()
@@ -147,8 +154,11 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
+        revoked = revoke_user_tokens(db, user.id)
         db.delete(user)    # 🗑 actually remove from DB
         db.commit()
+        principal_cache.invalidate(user_id)
+        token_denylist.add_many(revoked)
         return None        # 204 No Content → no response body
     except Exception as e:
         db.rollback()
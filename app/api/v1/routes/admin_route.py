@@ -1,79 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import func
+from datetime import date, datetime, timedelta, timezone
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from datetime import datetime, timezone
 
 from app.api.v1.routes.admin import users, courses, quizzes
+from app.core.config import settings
+from app.core.limiter import thread_limiter_status
 from app.db.deps import get_db
-from app.models.user import User
-from app.models.course import Course
-from app.models.subscription_plan import SubscriptionPlan, UserSubscription
-from app.schemas.admin import AdminDashboardOut
+from app.db.pool import pool_status
+from app.db.session import async_engine, engine
+from app.schemas.admin import AdminDashboardOut, PoolStatsOut, RevenueBucketOut, RevenueSeriesOut
+from app.services.dashboard import DashboardSnapshot, dashboard_metrics
+from app.services.revenue import bucket_count, revenue_series
 
 router = APIRouter()
 router.include_router(users.router, prefix="/users", tags=["admin-users"])
 router.include_router(courses.router, prefix="/courses", tags=["admin-courses"])
 router.include_router(quizzes.router, prefix="/quizzes", tags=["admin-quizzes"])
 
+def _dashboard_out(snapshot: DashboardSnapshot) -> AdminDashboardOut:
+    values = snapshot.values
+    return AdminDashboardOut(
+        total_users=values.get("total_users") or 0,
+        total_courses=values.get("total_courses") or 0,
+        active_subscriptions=values.get("active_subscriptions") or 0,
+        total_revenue=values.get("total_revenue") or 0,
+        monthly_growth=values.get("monthly_growth") or 0.0,
+        as_of=snapshot.as_of,
+        metrics=values,
+    )
+
+
 @router.get('/dashboard', response_model=AdminDashboardOut)
-def dashboard(db: Session = Depends(get_db)):
+async def dashboard():
+    # Served from the background-refreshed snapshot; no per-request aggregates
     try:
-        # Totals
-        total_users = db.query(func.count(User.id)).scalar() or 0
-        total_courses = db.query(func.count(Course.id)).scalar() or 0
-        active_subscriptions = (
-            db.query(func.count(UserSubscription.id))
-            .filter(UserSubscription.status == "active")
-            .scalar()
-            or 0
+        snapshot = dashboard_metrics.snapshot or await dashboard_metrics.refresh()
+        return _dashboard_out(snapshot)
+    except Exception as e:
+        # Raise HTTP 400 or 500 with a JSON message
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
         )
 
-        # Revenue (current month)
-        now = datetime.now(timezone.utc)
-        start_current = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        # Join subscriptions with plans, filter by started_at in current month and active status
-        current_revenue = (
-            db.query(func.coalesce(func.sum(SubscriptionPlan.price_monthly), 0))
-            .select_from(UserSubscription)
-            .join(SubscriptionPlan, UserSubscription.plan_id == SubscriptionPlan.id)
-            .filter(
-                UserSubscription.status == "active",
-                UserSubscription.started_at >= start_current,
-            )
-            .scalar()
-            or 0
-        )
 
-        # Last month revenue
-        # Compute the start of last month and end of last month
-        month = start_current.month - 1 or 12
-        year = start_current.year - 1 if start_current.month == 1 else start_current.year
-        start_last = start_current.replace(year=year, month=month)
-        end_last = start_current
-        last_revenue = (
-            db.query(func.coalesce(func.sum(SubscriptionPlan.price_monthly), 0))
-            .select_from(UserSubscription)
-            .join(SubscriptionPlan, UserSubscription.plan_id == SubscriptionPlan.id)
-            .filter(
-                UserSubscription.status == "active",
-                UserSubscription.started_at >= start_last,
-                UserSubscription.started_at < end_last,
-            )
-            .scalar()
-            or 0
+@router.post('/dashboard/refresh', response_model=AdminDashboardOut)
+async def refresh_dashboard():
+    """ダッシュボード指標を今すぐ再計算する。"""
+    try:
+        return _dashboard_out(await dashboard_metrics.refresh(force=True))
+    except Exception as e:
+        # Raise HTTP 400 or 500 with a JSON message
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
         )
 
-        # Monthly growth
-        monthly_growth = 0.0
-        if last_revenue > 0:
-            monthly_growth = ((current_revenue - last_revenue) / last_revenue) * 100.0
 
-        return AdminDashboardOut(
-            total_users=total_users,
-            total_courses=total_courses,
-            active_subscriptions=active_subscriptions,
-            total_revenue=int(current_revenue),
-            monthly_growth=monthly_growth,
+@router.get('/revenue', response_model=RevenueSeriesOut)
+def revenue(
+    start: Optional[date] = Query(None, alias="from", description="開始日（UTC、既定は終了日の29日前）"),
+    end: Optional[date] = Query(None, alias="to", description="終了日（UTC、当日を含む、既定は今日）"),
+    bucket: Literal["day", "week", "month"] = Query("day", description="集計単位"),
+    db: Session = Depends(get_db),
+):
+    """日次売上ロールアップ（サブスクリプション・コース購入）からの売上推移。"""
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=29)
+    if start > end:
+        raise HTTPException(status_code=400, detail={"status": "failed", "error": "from must not be after to"})
+    if bucket_count(start, end, bucket) > settings.revenue_max_buckets:
+        raise HTTPException(
+            status_code=422,
+            detail={
+                "status": "failed",
+                "error": f"range spans more than {settings.revenue_max_buckets} {bucket} buckets; use a larger bucket",
+            },
+        )
+    try:
+        buckets = [RevenueBucketOut(**entry) for entry in revenue_series(db, start, end, bucket)]
+        return RevenueSeriesOut(
+            bucket=bucket,
+            start=start,
+            end=end,
+            total_amount=sum(b.amount for b in buckets),
+            buckets=buckets,
         )
     except Exception as e:
         db.rollback()
@@ -84,4 +103,15 @@ def dashboard(db: Session = Depends(get_db)):
                 "status": "failed",
                 "error": str(e),
             }
-        )
\ No newline at end of file
+        )
+
+
+@router.get('/pool', response_model=PoolStatsOut)
+async def pool_stats():
+    # async so the limiter can be inspected from the event loop and the
+    # report itself never waits on a worker thread
+    return PoolStatsOut(
+        sync_pool=pool_status(engine.pool),
+        async_pool=pool_status(async_engine.pool),
+        thread_limiter=thread_limiter_status(),
+    )
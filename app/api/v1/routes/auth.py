@@ -2,32 +2,44 @@ from datetime import datetime, timezone, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy import false, text
+from sqlalchemy import false, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from jose import jwt, JWTError
+from jose import JWTError
 
-from app.db.deps import get_db
+from app.db.deps import get_async_db, get_db
 from app.models.user import User
 from app.models.token import PasswordResetToken
-from app.schemas.user import ResetPassword, UserCreate, AuthResponse, Token, TokenPayload, LoginRequest, PasswordResetConfirm
-from app.core.security import get_password_hash, verify_password, create_access_token
+from app.schemas.user import ResetPassword, UserCreate, AuthResponse, Token, TokenPayload, LoginRequest, PasswordResetConfirm, UserOut
+from app.core.keyring import key_ring
+from app.core.security import issue_access_token, password_hasher
 from app.core.config import settings
+from app.services.principal_cache import principal_cache
+from app.services.revocation import revoke_token, token_denylist
+from app.services.token_store import hash_token
 
 router = APIRouter()
 
 reuseable_oauth2 = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 
 
-def authenticate_user(db: Session, email: str, password: str) -> User | None:
-    user: User | None = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password_hash):
-        return False
-    return user
+async def authenticate_user(db: AsyncSession, email: str, password: str) -> tuple[int, str | None] | None:
+    """Return (user_id, rehashed password or None) when the credentials match."""
+    row = (await db.execute(select(User.id, User.password_hash).where(User.email == email))).first()
+    # Hand the connection back before the CPU-bound verify
+    await db.commit()
+    if not row:
+        return None
+    ok, new_hash = await password_hasher.verify_and_update(password, row.password_hash)
+    if not ok:
+        return None
+    return row.id, new_hash
 
 @router.post("/register", response_model=AuthResponse, status_code=status.HTTP_201_CREATED)
-def register(user_in: UserCreate, db: Session = Depends(get_db)) -> AuthResponse:
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)) -> AuthResponse:
     # Check if email already exists
-    existing = db.query(User).filter(User.email == user_in.email).first()
+    existing = await db.scalar(select(User.id).where(User.email == user_in.email))
+    await db.commit()  # release the connection while hashing
     if existing:
         raise HTTPException(
             status_code=400,
@@ -37,19 +49,22 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)) -> AuthResponse
                 "details": {}
             }
         )
+    password_hash = await password_hasher.hash(user_in.password)
     try:
         user = User(
             name=user_in.name,
             email=user_in.email,
-            password_hash=get_password_hash(user_in.password),
+            password_hash=password_hash,
         )
         db.add(user)
-        db.commit()
-        db.refresh(user)
-        token = create_access_token(subject=str(user.id))
+        await db.flush()
+        token, jti, expire_at = issue_access_token(subject=str(user.id))
+        db.add(PasswordResetToken(user_id=user.id, token_hash=hash_token(token), jti=jti, expires_at=expire_at))
+        await db.commit()
+        await db.refresh(user)
         return AuthResponse(user=user, token=token)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail={
@@ -60,44 +75,48 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)) -> AuthResponse
         )
 
 @router.post("/login", response_model=AuthResponse)
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = authenticate_user(db, payload.email, payload.password)
-    if not user:
+async def login(payload: LoginRequest, db: AsyncSession = Depends(get_async_db)):
+    authenticated = await authenticate_user(db, payload.email, payload.password)
+    if not authenticated:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="認証失敗"
         )
-
-    # ユーザーの last_login_at を更新
-    db.execute(
-        text("UPDATE users SET last_login_at = :ts, email_verified = true WHERE id = :id"),
-        {"ts": datetime.now(tz=timezone.utc), "id": user.id},
-    )
-    db.commit()
-    db.refresh(user)
+    user_id, new_hash = authenticated
 
     # アクセストークン生成
-    token = create_access_token(subject=str(user.id))
-
-    # Token を DB に保存
-    expires_minutes = settings.access_token_expire_minutes
-    expire_at = datetime.now(tz=timezone.utc) + timedelta(minutes=expires_minutes)
-
-    db_token = PasswordResetToken(
-        user_id=user.id,
-        token=token,
-        expires_at=expire_at,
+    token, jti, expire_at = issue_access_token(subject=str(user_id))
+    now = datetime.now(tz=timezone.utc)
+
+    # last_login_at の更新（コスト変更時はハッシュも更新）とトークン保存を1文で実行:
+    # WITH issued AS (INSERT INTO password_reset_tokens ...) UPDATE users ... RETURNING users.*
+    values = {"last_login_at": now, "email_verified": True}
+    if new_hash:
+        values["password_hash"] = new_hash
+    issued = (
+        insert(PasswordResetToken)
+        .values(user_id=user_id, token_hash=hash_token(token), jti=jti, expires_at=expire_at)
+        .cte("issued")
     )
-    db.add(db_token)
-    db.commit()
-    db.refresh(db_token)
+    stmt = update(User).where(User.id == user_id).values(**values).returning(User).add_cte(issued)
+    user = (
+        await db.execute(select(User).from_statement(stmt), execution_options={"populate_existing": True})
+    ).scalar_one()
+    await db.commit()
+    principal_cache.invalidate(user_id)
 
     # レスポンス
     return AuthResponse(user=user, token=token)
 
 
 @router.post("/logout")
-def logout():
+async def logout(db: AsyncSession = Depends(get_async_db), token: str = Depends(reuseable_oauth2)):
+    token_data = _decode_token(token)
+    # Tokens issued before jti existed cannot be revoked individually; they just expire
+    if token_data.jti and token_data.exp:
+        user_id = int(token_data.sub) if token_data.sub else None
+        expires_at = datetime.fromtimestamp(token_data.exp, tz=timezone.utc)
+        await revoke_token(db, token_data.jti, user_id, expires_at)
     return {"message": "ログアウト成功"}
 
 @router.post("/password/reset")
@@ -117,47 +136,88 @@ def password_reset_request(payload: ResetPassword, db: Session = Depends(get_db)
         )
 
 @router.post("/password/reset/confirm", status_code=200)
-def reset_password_confirm(payload: PasswordResetConfirm, db: Session = Depends(get_db)):
-    reset_entry = (
-        db.query(PasswordResetToken)
-        .filter(
-            PasswordResetToken.token == payload.token,
+async def reset_password_confirm(payload: PasswordResetConfirm, db: AsyncSession = Depends(get_async_db)):
+    reset_entry = await db.scalar(
+        select(PasswordResetToken)
+        .where(
+            PasswordResetToken.token_hash == hash_token(payload.token),
             PasswordResetToken.expires_at > datetime.now(timezone.utc),
         )
-        .first()
+        .limit(1)
     )
+    await db.commit()  # release the connection while hashing
     if not reset_entry:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid or expired reset token"
         )
+    new_hash = await password_hasher.hash(payload.new_password)
+
     expires_minutes = settings.access_token_expire_minutes
     reset_entry.expires_at = datetime.now(timezone.utc) + timedelta(minutes=expires_minutes)
 
     # 2. Fetch the user
-    user = db.query(User).filter(User.id == reset_entry.user_id).first()
+    user = await db.get(User, reset_entry.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # 3. Update password
-    user.password_hash = get_password_hash(payload.new_password)
+    user.password_hash = new_hash
     user.updated_at = datetime.now(timezone.utc)
-    db.commit()
-    db.refresh(reset_entry)
+    await db.commit()
+    principal_cache.invalidate(user.id)
 
     return {"message": "Password successfully reset"}
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(reuseable_oauth2)) -> User:
+def _decode_token(token: str) -> TokenPayload:
     try:
-        payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
+        payload = key_ring.verify(token)
         token_data = TokenPayload(**payload)
     except JWTError:
         raise HTTPException(status_code=403, detail="Could not validate credentials")
+    if token_data.jti and token_denylist.is_revoked(token_data.jti):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return token_data
+
+
+def get_current_user(db: Session = Depends(get_db), token: str = Depends(reuseable_oauth2)) -> User:
+    """Load the full ORM user; use for routes that modify the current user."""
+    token_data = _decode_token(token)
     user = db.get(User, int(token_data.sub)) if token_data.sub else None
     if not user or not user.is_active:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+
+def get_current_principal(db: Session = Depends(get_db), token: str = Depends(reuseable_oauth2)) -> UserOut:
+    """Read-only view of the current user, served from the principal cache when possible.
+
+    The session is only checked out on a cache miss.
+    """
+    token_data = _decode_token(token)
+    user_id = int(token_data.sub) if token_data.sub else None
+    principal = principal_cache.get(user_id) if user_id else None
+    if principal is None:
+        user = db.get(User, user_id) if user_id else None
+        if not user or not user.is_active:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = principal_cache.put(user)
+    return principal
+
+
+async def get_current_principal_async(
+    db: AsyncSession = Depends(get_async_db), token: str = Depends(reuseable_oauth2)
+) -> UserOut:
+    token_data = _decode_token(token)
+    user_id = int(token_data.sub) if token_data.sub else None
+    principal = principal_cache.get(user_id) if user_id else None
+    if principal is None:
+        user = await db.get(User, user_id) if user_id else None
+        if not user or not user.is_active:
+            raise HTTPException(status_code=404, detail="User not found")
+        principal = principal_cache.put(user)
+    return principal
+
 # def create_password_reset_token(db: Session, user: User) -> PasswordResetToken:
 #     # Token expiry (example: 30 minutes)
 #     expires_minutes = settings.access_token_expire_minutes
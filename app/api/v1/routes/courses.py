@@ -1,12 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 
-from app.db.deps import get_db
-from app.api.v1.routes.auth import get_current_user
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.deps import get_async_db, get_db
+from app.api.v1.routes.auth import get_current_principal_async
 from app.models.user import User
+from app.schemas.user import UserOut
 from app.models.course import Course, CourseCategory, UserCourseProgress, PublishStatus, DifficultyLevel, CourseVideo
 from app.schemas.course import (
     CourseCreate,
@@ -19,51 +22,126 @@ from app.schemas.course import (
     CourseDetailOut,
     UserProgressOut,
     CourseProgressUpdateIn,
+    VideoHeartbeatBatchIn,
+    VideoHeartbeatBatchOut,
+    VideoProgressOut,
 )
 from app.models.quiz import Quiz, QuizQuestion
 from app.schemas.quiz import QuizOut
+from app.services.catalog import course_catalog, course_counts
+from app.services.course_media import course_media
+from app.services.progress_buffer import BufferedProgress, progress_buffer, upsert_course_progress_tracked
+from app.services.user_stats import apply_stats_deltas, course_progress_deltas, stats_delta
+from app.services.video_progress import course_watched_seconds, fold_events, upsert_video_progress
+from app.services.response_cache import cache_and_respond, make_key, response_cache
 
 router = APIRouter()
 
 
+async def _cached_count(db: AsyncSession, key: tuple, q) -> int:
+    cached = course_counts.get(key)
+    if cached is not None:
+        return cached
+    count = await db.scalar(select(func.count()).select_from(q.subquery())) or 0
+    return course_counts.set(key, count)
+
+
 @router.get("/", response_model=CourseListResponse)
-def list_courses(
-    db: Session = Depends(get_db),
+async def list_courses(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     category_id: Optional[int] = Query(None, description="カテゴリでフィルタリング"),
     difficulty: Optional[DifficultyLevel] = Query(None, description="難易度でフィルタリング"),
     is_premium: Optional[bool] = Query(None, description="プレミアムコースでフィルタリング"),
     page: int = Query(1, description="ページ番号", ge=1),
     limit: int = Query(20, description="1ページあたりの件数", ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="次ページカーソル（指定時は page を無視）"),
+    include_total: bool = Query(True, description="総件数（キャッシュ値）を含める"),
 ):
     try:
+        key = make_key(
+            "courses.list",
+            category_id=category_id,
+            difficulty=difficulty,
+            is_premium=is_premium,
+            page=None if cursor else page,
+            limit=limit,
+            cursor=cursor,
+            include_total=include_total,
+        )
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached.to_response(request)
+
+        # Serve from the in-process catalog snapshot when it is loaded (no DB round trip)
+        if course_catalog.ready:
+            after = tuple(decode_cursor(cursor, 2)) if cursor else None
+            courses, total_count, next_key = course_catalog.query(
+                category_id=category_id,
+                difficulty=difficulty,
+                is_premium=is_premium,
+                offset=(page - 1) * limit,
+                limit=limit,
+                after=after,
+            )
+            result = CourseListResponse(
+                courses=courses,
+                total_count=total_count if include_total else None,
+                current_page=None if cursor else page,
+                total_pages=(total_count + limit - 1) // limit if include_total else None,
+                next_cursor=encode_cursor(*next_key) if next_key else None,
+            )
+            return cache_and_respond(request, key, result.model_dump_json().encode(), tags=("courses",))
+
         # Build base query with filters
-        q = db.query(Course)
+        q = select(Course)
         if category_id is not None:
-            q = q.filter(Course.category_id == category_id)
+            q = q.where(Course.category_id == category_id)
         if difficulty is not None:
-            q = q.filter(Course.difficulty == difficulty)
+            q = q.where(Course.difficulty == difficulty)
         if is_premium is not None:
-            q = q.filter(Course.is_premium == is_premium)
-        q = q.filter(Course.status != PublishStatus.archived)
-        
-        # Get total count for pagination
-        total_count = q.count()
-        
-        # Calculate pagination
-        offset = (page - 1) * limit
-        total_pages = (total_count + limit - 1) // limit  # Ceiling division
-        
-        # Apply pagination and ordering
-        courses = q.order_by(Course.sort_order.asc(), Course.id.desc()).offset(offset).limit(limit).all()
-        
-        return CourseListResponse(
+            q = q.where(Course.is_premium == is_premium)
+        q = q.where(Course.status != PublishStatus.archived)
+
+        # Total count is served from a short-lived cache instead of a COUNT per call
+        total_count: Optional[int] = None
+        total_pages: Optional[int] = None
+        if include_total:
+            total_count = await _cached_count(db, (category_id, difficulty, is_premium), q)
+            total_pages = (total_count + limit - 1) // limit  # Ceiling division
+
+        # Keyset pagination on (sort_order ASC, id DESC), backed by ix_courses_catalog_order
+        ordered = q.order_by(Course.sort_order.asc(), Course.id.desc())
+        if cursor:
+            last_sort_order, last_id = decode_cursor(cursor, 2)
+            ordered = ordered.where(
+                or_(
+                    Course.sort_order > last_sort_order,
+                    and_(Course.sort_order == last_sort_order, Course.id < last_id),
+                )
+            )
+            current_page = None
+        else:
+            ordered = ordered.offset((page - 1) * limit)
+            current_page = page
+
+        # Fetch one extra row to know whether another page exists
+        rows = (await db.scalars(ordered.limit(limit + 1))).all()
+        courses = rows[:limit]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(courses[-1].sort_order, courses[-1].id)
+
+        result = CourseListResponse(
             courses=courses,
             total_count=total_count,
-            current_page=page,
-            total_pages=total_pages
+            current_page=current_page,
+            total_pages=total_pages,
+            next_cursor=next_cursor,
         )
+        return cache_and_respond(request, key, result.model_dump_json().encode(), tags=("courses",))
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -74,34 +152,36 @@ def list_courses(
         )
 
 @router.get("/{course_id}", response_model=CourseDetailOut)
-def get_course(course_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_course(
+    course_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
+):
     try:
-        course = db.get(Course, course_id)
+        course = await db.get(Course, course_id)
         if not course or course.status == PublishStatus.archived:
             raise HTTPException(status_code=404, detail="Course not found")
 
         # Resolve category name if present
         category_name: Optional[str] = None
         if course.category_id:
-            category = db.query(CourseCategory).filter(CourseCategory.id == course.category_id).first()
-            category_name = category.name if category else None
+            category_name = await db.scalar(
+                select(CourseCategory.name).where(CourseCategory.id == course.category_id)
+            )
 
         # Fetch user progress
-        progress = (
-            db.query(UserCourseProgress)
-            .filter(UserCourseProgress.user_id == current_user.id, UserCourseProgress.course_id == course.id)
-            .first()
+        progress = await db.scalar(
+            select(UserCourseProgress)
+            .where(UserCourseProgress.user_id == current_user.id, UserCourseProgress.course_id == course.id)
+            .limit(1)
         )
         user_progress: Optional[UserProgressOut] = None
         if progress:
-            user_progress = UserProgressOut(
-                course_id=progress.course_id,
-                progress_percentage=progress.progress_percentage,
-                current_video_id=progress.current_video_id,
-                started_at=progress.started_at,
-                last_accessed_at=progress.last_accessed_at,
-                completed_at=progress.completed_at,
-            )
+            user_progress = UserProgressOut.model_validate(progress, from_attributes=True)
+        # Read-your-writes: heartbeats still waiting in the write-behind buffer win
+        buffered = progress_buffer.get(current_user.id, course.id) if progress_buffer.enabled else None
+        if buffered:
+            user_progress = UserProgressOut(**buffered.merged_with(user_progress.model_dump() if user_progress else None))
 
         # Build response explicitly to inject category_name
         base = CourseOut.model_validate(course)
@@ -117,12 +197,13 @@ def get_course(course_id: int, db: Session = Depends(get_db), current_user: User
             category_id=base.category_id,
             category_name=category_name,
             estimated_duration_minutes=base.estimated_duration_minutes,
+            total_duration_seconds=base.total_duration_seconds,
             created_at=base.created_at,
             updated_at=base.updated_at,
             user_progress=user_progress,
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -133,22 +214,27 @@ def get_course(course_id: int, db: Session = Depends(get_db), current_user: User
         )
 
 @router.put("/{course_id}/progress", response_model=UserProgressOut)
-def update_progress(
+async def update_progress(
     course_id: int,
     body: CourseProgressUpdateIn,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
 ):
     try:
-        # Validate course
-        course = db.get(Course, course_id)
-        if not course:
-            raise HTTPException(status_code=404, detail="Course not found")
+        # Course duration and video IDs come from the denormalized index, so the
+        # heartbeat needs no aggregate or validation query
+        media = course_media.get(course_id)
+        if media is None:
+            row = (
+                await db.execute(
+                    select(Course.total_duration_seconds, Course.video_ids).where(Course.id == course_id)
+                )
+            ).first()
+            if not row:
+                raise HTTPException(status_code=404, detail="Course not found")
+            media = course_media.set(course_id, row.total_duration_seconds, row.video_ids)
 
-        # Compute total duration seconds for the course
-        total_duration_seconds = (
-            db.query(func.coalesce(func.sum(CourseVideo.duration_seconds), 0)).filter(CourseVideo.course_id == course_id).scalar()
-        )
+        total_duration_seconds = media.total_duration_seconds
         if total_duration_seconds <= 0:
             # Avoid division by zero; treat as 0% when no videos/duration
             computed_percentage = 0
@@ -159,55 +245,106 @@ def update_progress(
             if body.is_completed:
                 computed_percentage = max(computed_percentage, 100)
 
-        # Upsert progress
-        progress = (
-            db.query(UserCourseProgress)
-            .filter(UserCourseProgress.user_id == current_user.id, UserCourseProgress.course_id == course_id)
-            .first()
+        now = datetime.now(timezone.utc)
+
+        # Validate current_video_id if provided; allow None/0 as null.
+        # If invalid, silently ignore it (the stored resume video is kept) to avoid FK errors
+        validated_video_id = body.current_video_id if body.current_video_id in media.video_ids else None
+
+        entry = BufferedProgress(
+            user_id=current_user.id,
+            course_id=course_id,
+            current_video_id=validated_video_id,
+            progress_percentage=computed_percentage,
+            started_at=now,
+            last_accessed_at=now,
+            completed_at=now if body.is_completed else None,
         )
-        now = datetime.utcnow()
-
-        # Validate current_video_id if provided; allow None/0 as null
-        validated_video_id = None
-        if body.current_video_id is not None and body.current_video_id != 0:
-            video = db.query(CourseVideo).filter(CourseVideo.id == body.current_video_id, CourseVideo.course_id == course_id).first()
-            if video:
-                validated_video_id = body.current_video_id
-            else:
-                # If invalid, silently ignore and store NULL to avoid FK errors
-                validated_video_id = None
+        if progress_buffer.accepts(current_user.id, course_id):
+            # Write-behind: keep only the latest state in memory; the flusher upserts it
+            entry = progress_buffer.put(entry)
+            await db.commit()
+            return UserProgressOut(**entry.row())
 
-        if progress:
-            progress.current_video_id = validated_video_id
-            progress.progress_percentage = computed_percentage
-            progress.last_accessed_at = now
-            if body.is_completed:
-                progress.completed_at = now
+        # One upsert, so concurrent first writes for the same course cannot collide
+        changed = (await db.execute(upsert_course_progress_tracked([entry.row()]))).one()
+        await apply_stats_deltas(db, course_progress_deltas([changed]))
+        await db.commit()
+        return UserProgressOut(**changed._mapping)
+    except Exception as e:
+        await db.rollback()
+        # Raise HTTP 400 or 500 with a JSON message
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
+        )
+
+@router.post("/{course_id}/heartbeats", response_model=VideoHeartbeatBatchOut, summary="動画視聴ハートビート（一括）")
+async def record_heartbeats(
+    course_id: int,
+    body: VideoHeartbeatBatchIn,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
+):
+    """Fold a batch of per-video events (queued offline by the player) into progress.
+
+    The batch becomes one user_video_progress upsert; course progress is then
+    recomputed from the stored per-video totals.
+    """
+    try:
+        media = course_media.get(course_id)
+        if media is None:
+            row = (
+                await db.execute(
+                    select(Course.total_duration_seconds, Course.video_ids).where(Course.id == course_id)
+                )
+            ).first()
+            if not row:
+                raise HTTPException(status_code=404, detail="Course not found")
+            media = course_media.set(course_id, row.total_duration_seconds, row.video_ids)
+
+        events = [e for e in body.events if e.video_id in media.video_ids]
+        folded = fold_events(events)
+        stored = await upsert_video_progress(db, current_user.id, course_id, folded)
+
+        total_duration_seconds = media.total_duration_seconds
+        computed_percentage = 0
+        if total_duration_seconds > 0:
+            watched = await course_watched_seconds(db, current_user.id, course_id)
+            computed_percentage = min(100, int(watched * 100 / total_duration_seconds))
+
+        now = datetime.now(timezone.utc)
+        latest = max(folded, key=lambda v: v.last_watched_at, default=None)
+        entry = BufferedProgress(
+            user_id=current_user.id,
+            course_id=course_id,
+            current_video_id=latest.video_id if latest else None,
+            progress_percentage=computed_percentage,
+            started_at=now,
+            last_accessed_at=now,
+            completed_at=now if computed_percentage >= 100 else None,
+        )
+        deltas = [stats_delta(current_user.id, now, total_watch_seconds=sum(row.added_seconds for row in stored))]
+        if progress_buffer.accepts(current_user.id, course_id):
+            # Course started/completed counts are applied when the buffer flushes
+            progress = UserProgressOut(**progress_buffer.put(entry).row())
         else:
-            progress = UserCourseProgress(
-                user_id=current_user.id,
-                course_id=course_id,
-                current_video_id=validated_video_id,
-                progress_percentage=computed_percentage,
-                started_at=now,
-                last_accessed_at=now,
-                completed_at=now if body.is_completed else None,
-            )
-            db.add(progress)
-
-        db.commit()
-        db.refresh(progress)
-
-        return UserProgressOut(
-            course_id=progress.course_id,
-            progress_percentage=progress.progress_percentage,
-            current_video_id=progress.current_video_id,
-            started_at=progress.started_at,
-            last_accessed_at=progress.last_accessed_at,
-            completed_at=progress.completed_at,
+            changed = (await db.execute(upsert_course_progress_tracked([entry.row()]))).one()
+            deltas.extend(course_progress_deltas([changed]))
+            progress = UserProgressOut(**changed._mapping)
+        await apply_stats_deltas(db, deltas)
+        await db.commit()
+
+        return VideoHeartbeatBatchOut(
+            accepted_events=len(events),
+            videos=[VideoProgressOut(**row._mapping) for row in stored],
+            progress=progress,
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -218,8 +355,13 @@ def update_progress(
         )
 
 @router.get("/{course_id}/quiz", response_model=QuizOut)
-def get_course_quiz(course_id: int, db: Session = Depends(get_db)):
+def get_course_quiz(course_id: int, request: Request, db: Session = Depends(get_db)):
     try:
+        key = make_key("courses.quiz", course_id=course_id)
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached.to_response(request)
+
         quiz = (
             db.query(Quiz)
             .options(selectinload(Quiz.questions).selectinload(QuizQuestion.options))
@@ -229,7 +371,8 @@ def get_course_quiz(course_id: int, db: Session = Depends(get_db)):
         )
         if not quiz:
             raise HTTPException(status_code=404, detail="Quiz not found for course")
-        return quiz
+        body = QuizOut.model_validate(quiz).model_dump_json().encode()
+        return cache_and_respond(request, key, body, tags=("quizzes", f"course:{course_id}"))
     except Exception as e:
         db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from app.services.response_cache import etag_matches
+from app.services.storage import storage_service
+
+router = APIRouter()
+
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"], summary="ローカルストレージのファイル配信")
+async def serve_file(key: str, request: Request):
+    """Serve an object from the filesystem backend.
+
+    The ETag is the content digest and keys are never rewritten, so clients
+    may cache indefinitely. ``Range`` requests (video seeks) are answered
+    from the file directly, and servers that offer ``http.response.pathsend``
+    get the path for a zero-copy send.
+    """
+    resolved = await storage_service.resolve_local(key)
+    if resolved is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    path, ref = resolved
+    headers = {"ETag": f'"{ref["sha256"]}"', "Cache-Control": "public, max-age=31536000, immutable"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=ref.get("content_type") or "application/octet-stream", headers=headers)
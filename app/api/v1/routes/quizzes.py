@@ -1,9 +1,13 @@
+from datetime import datetime, timezone
+
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import Boolean, Integer, and_, column, insert, select, true, values
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.deps import get_db
-from app.api.v1.routes.auth import get_current_user
+from app.db.deps import get_async_db
+from app.api.v1.routes.auth import get_current_principal_async
 from app.models.user import User
+from app.schemas.user import UserOut
 from app.models.quiz import Quiz, QuizQuestion, QuizQuestionOption, UserQuizAttempt, UserQuizAnswer
 from app.schemas.quiz import (
     QuizCreate,
@@ -13,65 +17,97 @@ from app.schemas.quiz import (
     QuizSubmissionIn,
     QuizSubmissionOut,
 )
+from app.services.answer_keys import GradeResult, answer_key_cache
+from app.services.user_stats import apply_stats_deltas, quiz_attempt_delta
 
 router = APIRouter()
 
 
+async def _persist_attempt(db: AsyncSession, user_id: int, quiz_id: int, graded: GradeResult) -> int:
+    """Write the attempt and its answers in a single statement; returns the attempt id.
+
+    Renders as ``WITH attempt AS (INSERT ... RETURNING id), answers AS
+    (INSERT ... SELECT FROM attempt, (VALUES ...)) SELECT id FROM attempt``.
+    Answers are joined against quiz_question_options so option ids that do
+    not belong to the question are dropped instead of failing the FK.
+    """
+    attempt = (
+        insert(UserQuizAttempt)
+        .values(
+            user_id=user_id,
+            quiz_id=quiz_id,
+            score=graded.score,
+            total_questions=graded.total_questions,
+            correct_answers=graded.correct_answers,
+            is_passed=graded.is_passed,
+            completed_at=datetime.now(timezone.utc),
+        )
+        .returning(UserQuizAttempt.id)
+        .cte("attempt")
+    )
+    stmt = select(attempt.c.id)
+    if graded.selections:
+        answer_rows = values(
+            column("question_id", Integer),
+            column("selected_option_id", Integer),
+            column("is_correct", Boolean),
+            name="answer_rows",
+        ).data(graded.selections)
+        answers = (
+            insert(UserQuizAnswer)
+            .from_select(
+                ["attempt_id", "question_id", "selected_option_id", "is_correct"],
+                select(attempt.c.id, answer_rows.c.question_id, answer_rows.c.selected_option_id, answer_rows.c.is_correct)
+                .select_from(attempt)
+                .join(answer_rows, true())
+                .join(
+                    QuizQuestionOption,
+                    and_(
+                        QuizQuestionOption.id == answer_rows.c.selected_option_id,
+                        QuizQuestionOption.question_id == answer_rows.c.question_id,
+                    ),
+                ),
+            )
+            .cte("answers")
+        )
+        stmt = stmt.add_cte(answers)
+    return (await db.execute(stmt)).scalar_one()
+
+
 @router.post("/{quiz_id}/submit", response_model=QuizSubmissionOut)
-def submit_quiz(
+async def submit_quiz(
     quiz_id: int,
     payload: QuizSubmissionIn,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
 ):
     try:
-        quiz = db.get(Quiz, quiz_id)
-        if not quiz or quiz.status != "active":
+        answer_key = await answer_key_cache.get(db, quiz_id)
+        if not answer_key or answer_key.status != "active":
             raise HTTPException(status_code=404, detail="Quiz not found or inactive")
 
-        # Fetch all question IDs for the quiz
-        question_rows = db.query(QuizQuestion.id).filter(QuizQuestion.quiz_id == quiz_id).all()
-        question_ids = [row.id for row in question_rows]
-        total_questions = len(question_ids)
-
-        # Map correct option per question
-        correct_map = {}
-        if question_ids:
-            rows = (
-                db.query(QuizQuestionOption.question_id, QuizQuestionOption.id)
-                .filter(QuizQuestionOption.question_id.in_(question_ids), QuizQuestionOption.is_correct == True)
-                .all()
-            )
-            for qid, oid in rows:
-                correct_map[qid] = oid
-
-        correct = 0
-        results = []
-        for ans in payload.answers:
-            qid = ans.question_id
-            selected = ans.selected_option_id
-            correct_option_id = correct_map.get(qid)
-            is_correct = bool(correct_option_id and selected == correct_option_id)
-            if is_correct:
-                correct += 1
-            results.append({
-                "question_id": qid,
-                "is_correct": is_correct,
-                "correct_answer": correct_option_id or 0,
-            })
-
-        score_pct = int((correct / total_questions) * 100) if total_questions else 0
-        is_passed = score_pct >= (quiz.passing_score_percentage or 0)
+        graded = answer_key.grade((ans.question_id, ans.selected_option_id) for ans in payload.answers)
+        attempt_id = await _persist_attempt(db, current_user.id, quiz_id, graded)
+        await apply_stats_deltas(
+            db,
+            [
+                quiz_attempt_delta(
+                    current_user.id, quiz_id, attempt_id, graded.score, graded.is_passed, datetime.now(timezone.utc)
+                )
+            ],
+        )
+        await db.commit()
 
         return QuizSubmissionOut(
-            score=score_pct,
-            total_questions=total_questions,
-            correct_answers=correct,
-            is_passed=is_passed,
-            results=results,
+            attempt_id=attempt_id,
+            score=graded.score,
+            total_questions=graded.total_questions,
+            correct_answers=graded.correct_answers,
+            is_passed=graded.is_passed,
+            results=graded.results,
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
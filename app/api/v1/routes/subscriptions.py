@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
 
 from app.db.deps import get_db
-from app.api.v1.routes.auth import get_current_user
+from app.api.v1.routes.auth import get_current_principal
 from app.models.user import User
+from app.schemas.user import UserOut
 from app.models.subscription_plan import SubscriptionPlan, UserSubscription
 from app.schemas.subscription import SubscriptionPlanOut, SubscribeIn, SubscribeOut, ChangePlanIn, ChangePlanOut
+from app.services.response_cache import cache_and_respond, make_key, response_cache
 
 router = APIRouter()
 
+plan_list_adapter = TypeAdapter(list[SubscriptionPlanOut])
+
 @router.get('/plans', response_model=list[SubscriptionPlanOut])
-def list_plans(db: Session = Depends(get_db)):
+def list_plans(request: Request, db: Session = Depends(get_db)):
     try:
+        key = make_key("subscription.plans")
+        cached = response_cache.get(key)
+        if cached is not None:
+            return cached.to_response(request)
+
         plans = (
             db.query(SubscriptionPlan)
             .filter(SubscriptionPlan.is_active == True)
@@ -29,7 +39,9 @@ def list_plans(db: Session = Depends(get_db)):
                     "クイズ機能",
                     "修了証書",
                 ]
-        return plans
+        body = plan_list_adapter.dump_json(plan_list_adapter.validate_python(plans, from_attributes=True))
+        # No route writes plans (they are edited in the database), so only the TTL refreshes them
+        return cache_and_respond(request, key, body, tags=())
     except Exception as e:
         db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
@@ -42,7 +54,7 @@ def list_plans(db: Session = Depends(get_db)):
         )
 
 @router.post("/subscribe", response_model=SubscribeOut)
-def subscribe(body: SubscribeIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def subscribe(body: SubscribeIn, db: Session = Depends(get_db), current_user: UserOut = Depends(get_current_principal)):
     try:
         plan = db.get(SubscriptionPlan, body.plan_id)
         if not plan or not plan.is_active:
@@ -88,7 +100,7 @@ def subscribe(body: SubscribeIn, db: Session = Depends(get_db), current_user: Us
 
 
 @router.post("/cancel")
-def cancel(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def cancel(db: Session = Depends(get_db), current_user: UserOut = Depends(get_current_principal)):
     try:
         sub = (
             db.query(UserSubscription)
@@ -121,7 +133,7 @@ def cancel(db: Session = Depends(get_db), current_user: User = Depends(get_curre
 def change_plan(
     body: ChangePlanIn,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: UserOut = Depends(get_current_principal),
 ):
     try:
         # Validate new plan
@@ -1,31 +1,60 @@
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
-from sqlalchemy.orm import Session
+from typing import Literal
 
-from app.api.v1.routes.auth import get_current_user
-from app.db.deps import get_db
+from fastapi import APIRouter, Depends, File, Request, Response, UploadFile, HTTPException
+from jose import JWTError
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.v1.routes.auth import get_current_principal_async
+from app.core.keyring import key_ring
+from app.db.deps import get_async_db
 from app.models.user import User
 from app.models.course import Course
+from app.schemas.upload import CompleteUploadIn, CompleteUploadOut, PresignUploadIn, PresignUploadOut
+from app.schemas.user import UserOut
+from app.services.catalog import course_catalog
+from app.services.principal_cache import principal_cache
+from app.services.response_cache import response_cache
 from app.services.storage import storage_service
 
 router = APIRouter()
 
+# Course media kind -> (storage key segment, Course column)
+COURSE_MEDIA = {
+    "video": ("videos", "video_url"),
+    "thumbnail": ("thumbnails", "thumbnail_url"),
+}
+
+
+async def _get_course(db: AsyncSession, course_id: int) -> Course:
+    course = await db.get(Course, course_id)
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    # Hand the connection back while storage I/O runs
+    await db.commit()
+    return course
+
+
+async def _save_avatar(db: AsyncSession, user_id: int, url: str) -> None:
+    await db.execute(update(User).where(User.id == user_id).values(avatar_url=url))
+    await db.commit()
+    principal_cache.invalidate(user_id)
+
 
 @router.post("/avatar")
 async def upload_avatar(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
 ):
     try:
-        content = await file.read()
-        if not content:
-            raise HTTPException(status_code=400, detail="Empty file")
-        url = storage_service.upload_bytes(content, key_prefix=f"avatars/{current_user.id}", content_type=file.content_type)
-        current_user.avatar_url = url
-        db.commit()
+        url = await storage_service.upload_stream(
+            file, key_prefix=f"avatars/{current_user.id}", content_type=file.content_type, allow_empty=False
+        )
+        await _save_avatar(db, current_user.id, url)
         return {"url": url}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -37,18 +66,17 @@ async def upload_avatar(
 
 
 @router.post("/courses/{course_id}/thumbnail")
-async def upload_course_thumbnail(course_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_course_thumbnail(course_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     try:
-        course = db.get(Course, course_id)
-        if not course:
-            raise HTTPException(status_code=404, detail="Course not found")
-        content = await file.read()
-        url = storage_service.upload_bytes(content, key_prefix=f"courses/{course_id}/thumbnails", content_type=file.content_type)
+        course = await _get_course(db, course_id)
+        url = await storage_service.upload_stream(file, key_prefix=f"courses/{course_id}/thumbnails", content_type=file.content_type)
         course.thumbnail_url = url
-        db.commit()
+        await db.commit()
+        course_catalog.upsert(course)
+        response_cache.invalidate_tags("courses", f"course:{course_id}")
         return {"url": url}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -60,18 +88,17 @@ async def upload_course_thumbnail(course_id: int, file: UploadFile = File(...),
 
 
 @router.post("/courses/{course_id}/video")
-async def upload_course_video(course_id: int, file: UploadFile = File(...), db: Session = Depends(get_db)):
+async def upload_course_video(course_id: int, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
     try:
-        course = db.get(Course, course_id)
-        if not course:
-            raise HTTPException(status_code=404, detail="Course not found")
-        content = await file.read()
-        url = storage_service.upload_bytes(content, key_prefix=f"courses/{course_id}/videos", content_type=file.content_type)
+        course = await _get_course(db, course_id)
+        url = await storage_service.upload_stream(file, key_prefix=f"courses/{course_id}/videos", content_type=file.content_type)
         course.video_url = url
-        db.commit()
+        await db.commit()
+        course_catalog.upsert(course)
+        response_cache.invalidate_tags("courses", f"course:{course_id}")
         return {"url": url}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -80,3 +107,127 @@ async def upload_course_video(course_id: int, file: UploadFile = File(...), db:
                 "error": str(e),
             }
         )
+
+
+@router.post("/avatar/presign", response_model=PresignUploadOut, summary="アバター直接アップロードURL発行")
+async def presign_avatar(payload: PresignUploadIn, current_user: UserOut = Depends(get_current_principal_async)):
+    try:
+        return await storage_service.presign_upload(
+            f"avatars/{current_user.id}",
+            payload.size,
+            payload.content_type,
+            payload.checksum_sha256,
+            target="avatar",
+            uid=current_user.id,
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
+        )
+
+
+@router.post("/avatar/complete", response_model=CompleteUploadOut, summary="アバター直接アップロード完了")
+async def complete_avatar(
+    payload: CompleteUploadIn,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
+):
+    try:
+        url, size = await storage_service.complete_presigned_upload(
+            payload.ticket,
+            {p.part_number: p.etag for p in payload.parts} if payload.parts else None,
+            target="avatar",
+            uid=current_user.id,
+        )
+        await _save_avatar(db, current_user.id, url)
+        return CompleteUploadOut(url=url, size=size)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
+        )
+
+
+@router.post("/courses/{course_id}/{kind}/presign", response_model=PresignUploadOut, summary="コースメディア直接アップロードURL発行")
+async def presign_course_media(
+    course_id: int,
+    kind: Literal["video", "thumbnail"],
+    payload: PresignUploadIn,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        await _get_course(db, course_id)
+        segment, _ = COURSE_MEDIA[kind]
+        return await storage_service.presign_upload(
+            f"courses/{course_id}/{segment}",
+            payload.size,
+            payload.content_type,
+            payload.checksum_sha256,
+            target=kind,
+            course_id=course_id,
+        )
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
+        )
+
+
+@router.post("/courses/{course_id}/{kind}/complete", response_model=CompleteUploadOut, summary="コースメディア直接アップロード完了")
+async def complete_course_media(
+    course_id: int,
+    kind: Literal["video", "thumbnail"],
+    payload: CompleteUploadIn,
+    db: AsyncSession = Depends(get_async_db),
+):
+    try:
+        course = await _get_course(db, course_id)
+        url, size = await storage_service.complete_presigned_upload(
+            payload.ticket,
+            {p.part_number: p.etag for p in payload.parts} if payload.parts else None,
+            target=kind,
+            course_id=course_id,
+        )
+        _, column = COURSE_MEDIA[kind]
+        setattr(course, column, url)
+        await db.commit()
+        course_catalog.upsert(course)
+        response_cache.invalidate_tags("courses", f"course:{course_id}")
+        return CompleteUploadOut(url=url, size=size)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": str(e),
+            }
+        )
+
+
+@router.put("/local/{token}", include_in_schema=False)
+async def local_presigned_put(token: str, request: Request):
+    """Receiving end of presigned URLs issued by the filesystem backend."""
+    try:
+        claims = key_ring.verify(token)
+    except JWTError:
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    if claims.get("typ") != "local-put":
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+    try:
+        etag = await storage_service.receive_local_put(claims, request.stream())
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail={"status": "failed", "error": str(e)})
+    return Response(status_code=200, headers={"ETag": f'"{etag}"'})
@@ -1,19 +1,30 @@
-import os
-from fastapi import APIRouter, Depends, File, UploadFile, HTTPException
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.deps import get_db
-from app.api.v1.routes.auth import get_current_user
-from app.models.user import User
-from app.models.course import UserCourseProgress
-from app.schemas.user import UserOut, UserUpdate, UpdatePassword
-from app.core.security import verify_password, get_password_hash
+from app.core.pagination import decode_cursor, encode_cursor
+from app.db.deps import get_async_db, get_db
+from app.db.session import AsyncSessionLocal
+from app.api.v1.routes.auth import get_current_principal, get_current_principal_async, get_current_user
+from app.models.user import User, UserStats
+from app.models.course import Course, UserCourseProgress
+from app.schemas.course import MyCourseProgressOut
+from app.schemas.user import UserOut, UserStatsOut, UserUpdate, UpdatePassword
+from app.core.security import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.progress_buffer import progress_buffer
+from app.services.storage import storage_service
+from app.services.user_stats import stats_out
 
 router = APIRouter()
 
 
 @router.get("/profile", response_model=UserOut)
-def get_me(current_user: User = Depends(get_current_user)):
+def get_me(current_user: UserOut = Depends(get_current_principal)):
     return current_user
 
 
@@ -31,6 +42,7 @@ def update_me(
         db.add(current_user)
         db.commit()
         db.refresh(current_user)
+        principal_cache.invalidate(current_user.id)
         return current_user
     except Exception as e:
         db.rollback()
@@ -47,28 +59,24 @@ def update_me(
 @router.post("/avatar")
 async def update_avatar(
     avatar: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
 ):
     try:
-        # Ensure directory exists
-        upload_dir = "public/avatars"
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # Save uploaded file
-        file_location = f"{upload_dir}/{current_user.id}_{avatar.filename}"
-        with open(file_location, "wb") as f:
-            f.write(await avatar.read())  # async read
+        # Stream to storage (S3 or the local content-addressed store) without blocking the loop
+        url = await storage_service.upload_stream(
+            avatar, key_prefix=f"avatars/{current_user.id}", content_type=avatar.content_type, allow_empty=False
+        )
 
         # Update DB column
-        current_user.avatar_url = f"/static/avatars/{current_user.id}_{avatar.filename}"
-        db.commit()
-        db.refresh(current_user)
+        await db.execute(update(User).where(User.id == current_user.id).values(avatar_url=url))
+        await db.commit()
+        principal_cache.invalidate(current_user.id)
 
         # Return only avatar_url
-        return {"avatar_url": current_user.avatar_url}
+        return {"avatar_url": url}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -79,29 +87,33 @@ async def update_avatar(
         )
 
 @router.put("/password")
-def update_password(
+async def update_password(
     payload: UpdatePassword,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
 ):
+    # Read the stored hash, then release the connection before the bcrypt work
+    password_hash = await db.scalar(select(User.password_hash).where(User.id == current_user.id))
+    await db.commit()
+
+    # Verify current password
+    if not password_hash or not await password_hasher.verify(payload.current_password, password_hash):
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "status": "failed",
+                "error": "現在のパスワードが正しくありません",
+            }
+        )
+    new_hash = await password_hasher.hash(payload.new_password)
     try:
-        # Verify current password
-        if not verify_password(payload.current_password, current_user.password_hash):
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "status": "failed",
-                    "error": str(e),
-                }
-            )
         # Update to new password
-        current_user.password_hash = get_password_hash(payload.new_password)
-        db.add(current_user)
-        db.commit()
-        db.refresh(current_user)
+        await db.execute(update(User).where(User.id == current_user.id).values(password_hash=new_hash))
+        await db.commit()
+        principal_cache.invalidate(current_user.id)
         return {"message": "Password updated successfully."}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -111,27 +123,140 @@ def update_password(
             }
         )
 
-@router.get("/progress")
-def my_progress(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    progresses = (
-        db.query(UserCourseProgress)
-        .filter(UserCourseProgress.user_id == current_user.id)
-        .all()
+@router.get("/stats", response_model=UserStatsOut)
+async def my_stats(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
+):
+    """学習統計（user_stats の1行を主キーで取得）。"""
+    stats = await db.get(UserStats, current_user.id)
+    return stats_out(stats)
+
+
+PROGRESS_COLUMNS = (
+    UserCourseProgress.id,
+    UserCourseProgress.course_id,
+    UserCourseProgress.progress_percentage,
+    UserCourseProgress.current_video_id,
+    UserCourseProgress.started_at,
+    UserCourseProgress.last_accessed_at,
+    UserCourseProgress.completed_at,
+    Course.title,
+    Course.thumbnail_url,
+    Course.total_duration_seconds,
+)
+
+
+def _progress_query(user_id: int, after_id: Optional[int], limit: Optional[int]):
+    """Progress rows joined with their course, newest first (keyset on progress id)."""
+    stmt = (
+        select(*PROGRESS_COLUMNS)
+        .join(Course, Course.id == UserCourseProgress.course_id)
+        .where(UserCourseProgress.user_id == user_id)
+        .order_by(UserCourseProgress.id.desc())
+    )
+    if after_id is not None:
+        stmt = stmt.where(UserCourseProgress.id < after_id)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+async def _buffered_only(db: AsyncSession, user_id: int) -> list[dict]:
+    """Buffered progress for courses with no stored row yet, with course metadata.
+
+    These rows have no id, so they sort ahead of everything stored and are
+    only returned on the first page.
+    """
+    if not progress_buffer.enabled:
+        return []
+    entries = {entry.course_id: entry for entry in progress_buffer.for_user(user_id)}
+    if not entries:
+        return []
+    stored = set(
+        (
+            await db.scalars(
+                select(UserCourseProgress.course_id).where(
+                    UserCourseProgress.user_id == user_id, UserCourseProgress.course_id.in_(entries)
+                )
+            )
+        ).all()
     )
+    missing = [course_id for course_id in entries if course_id not in stored]
+    if not missing:
+        return []
+    courses = (
+        await db.execute(
+            select(Course.id, Course.title, Course.thumbnail_url, Course.total_duration_seconds).where(
+                Course.id.in_(missing)
+            )
+        )
+    ).all()
+    rows = []
+    for course in courses:
+        row = entries[course.id].merged_with(None)
+        row.update(title=course.title, thumbnail_url=course.thumbnail_url, total_duration_seconds=course.total_duration_seconds)
+        rows.append(row)
+    return rows
+
+
+def _progress_out(row, user_id: int) -> MyCourseProgressOut:
+    data = dict(row._mapping)
+    data.pop("id")
+    # Read-your-writes: overlay heartbeats still waiting in the write-behind buffer
+    entry = progress_buffer.get(user_id, data["course_id"]) if progress_buffer.enabled else None
+    if entry is not None:
+        data.update(entry.merged_with(data))
+    return MyCourseProgressOut.model_validate(data)
+
+
+@router.get("/progress", response_model=List[MyCourseProgressOut])
+async def my_progress(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="次ページカーソル（X-Next-Cursor ヘッダーの値）"),
+    limit: Optional[int] = Query(None, description="1ページあたりの件数（JSON は既定 100、NDJSON は既定で全件）", ge=1, le=500),
+    output: Optional[Literal["json", "ndjson"]] = Query(None, alias="format", description="ndjson で1行1件のストリーミング応答"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserOut = Depends(get_current_principal_async),
+):
+    """受講中コースの進捗一覧（コース名・サムネイル・総再生時間付き）。
+
+    Keyset-paginated, newest progress first. With ``format=ndjson`` (or
+    ``Accept: application/x-ndjson``) rows are streamed from a server-side
+    cursor, one JSON object per line.
+    """
     try:
-        result = []
-        for p in progresses:
-            result.append({
-                "course_id": p.course_id,
-                "progress_percentage": p.progress_percentage,
-                "current_video_id": p.current_video_id,
-                "started_at": p.started_at.isoformat() if p.started_at else None,
-                "last_accessed_at": p.last_accessed_at.isoformat() if p.last_accessed_at else None,
-                "completed_at": p.completed_at.isoformat() if p.completed_at else None,
-            })
+        after_id = decode_cursor(cursor, 1)[0] if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail={"status": "failed", "error": str(e)})
+    ndjson = output == "ndjson" or (output is None and "application/x-ndjson" in request.headers.get("accept", ""))
+    user_id = current_user.id
+    stmt = _progress_query(user_id, after_id, limit if ndjson else (limit or 100) + 1)
+
+    if ndjson:
+        async def lines():
+            # The request-scoped session may be closed before the body is sent; stream on our own
+            async with AsyncSessionLocal() as stream_db:
+                if after_id is None:
+                    for row in await _buffered_only(stream_db, user_id):
+                        yield MyCourseProgressOut.model_validate(row).model_dump_json() + "\n"
+                async for row in await stream_db.stream(stmt):
+                    yield _progress_out(row, user_id).model_dump_json() + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    try:
+        page_size = limit or 100
+        rows = (await db.execute(stmt)).all()
+        result = [_progress_out(row, user_id) for row in rows[:page_size]]
+        if len(rows) > page_size:
+            response.headers["X-Next-Cursor"] = encode_cursor(rows[page_size - 1].id)
+        if after_id is None:
+            result[:0] = [MyCourseProgressOut.model_validate(row) for row in await _buffered_only(db, user_id)]
         return result
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         # Raise HTTP 400 or 500 with a JSON message
         raise HTTPException(
             status_code=400,
@@ -139,4 +264,4 @@ def my_progress(db: Session = Depends(get_db), current_user: User = Depends(get_
                 "status": "failed",
                 "error": str(e),
             }
-        )
\ No newline at end of file
+        )
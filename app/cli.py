@@ -1,10 +1,42 @@
-from app.db.session import engine
+import sys
+
+from app.db.session import SessionLocal, engine
 from app.models import Base  # noqa
+from app.services.course_media import rebuild_course_media
+from app.services.revenue import rebuild_revenue
+from app.services.user_stats import rebuild_user_stats
 
 
 def create_all() -> None:
     Base.metadata.create_all(bind=engine)
 
 
+def rebuild_course_media_index() -> None:
+    with SessionLocal() as db:
+        count = rebuild_course_media(db)
+    print(f"recomputed duration and video index for {count} courses")
+
+
+def rebuild_user_stats_table() -> None:
+    with SessionLocal() as db:
+        count = rebuild_user_stats(db)
+    print(f"rebuilt learning stats for {count} users")
+
+
+def rebuild_revenue_rollup() -> None:
+    with SessionLocal() as db:
+        count = rebuild_revenue(db)
+    print(f"rebuilt {count} daily revenue rows")
+
+
+COMMANDS = {
+    "create-all": create_all,
+    "rebuild-course-media": rebuild_course_media_index,
+    "rebuild-user-stats": rebuild_user_stats_table,
+    "rebuild-revenue": rebuild_revenue_rollup,
+}
+
+
 if __name__ == "__main__":
-    create_all()
+    # python -m app.cli [command]; without a command, create tables
+    COMMANDS[sys.argv[1] if len(sys.argv) > 1 else "create-all"]()
@@ -11,6 +11,29 @@ class Settings(BaseSettings):
     secret_key: str = secrets.token_urlsafe(32)
     access_token_expire_minutes: int = 60 * 24
     algorithm: str = "HS256"
+    # Key ring as JSON, e.g. JWT_SIGNING_KEYS='{"2026-10": "...", "2026-04": "..."}'.
+    # The active kid signs, every listed key verifies. Falls back to secret_key.
+    jwt_signing_keys: dict[str, str] = {}
+    jwt_active_kid: str | None = None
+    jwt_verify_cache_max_entries: int = 10000
+    jwt_verify_cache_ttl_seconds: int = 300
+
+    # Background purge of expired rows in password_reset_tokens
+    token_purge_interval_seconds: int = 3600
+    token_purge_batch_size: int = 5000
+    # How often each worker pulls new rows from revoked_tokens into its denylist
+    token_revocation_sync_seconds: int = 5
+
+    # Password hashing: bcrypt cost and the dedicated process pool that runs it.
+    # Calls beyond max_pending (queued + running) are rejected with 503.
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
+
+    # Authenticated-principal cache; read-only routes skip the user lookup on a hit.
+    # Set the TTL to 0 to always read the user row.
+    principal_cache_max_entries: int = 10000
+    principal_cache_ttl_seconds: int = 60
 
     # Database
     postgres_server: str = "localhost"
@@ -19,6 +42,39 @@ class Settings(BaseSettings):
     postgres_db: str = "learning"
     database_url: str | None = None
 
+    # Connection pool (applies to both the sync and async engines, per process)
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pool_stats_log_interval_seconds: int = 60
+
+    # Warn when one request runs the same statement shape more than N times (0 disables)
+    db_n_plus_one_threshold: int = 5
+
+    # Max sync (threadpool) handlers running at once; AnyIO defaults to 40
+    sync_handler_concurrency: int = 40
+
+    # Course catalog
+    course_count_cache_ttl_seconds: int = 60
+    course_count_cache_max_entries: int = 1024
+    # Full reload of the in-memory catalog; picks up writes made by other workers
+    course_catalog_refresh_seconds: int = 30
+
+    # Shared response cache for public catalog/quiz/plan reads
+    response_cache_max_entries: int = 1024
+    response_cache_ttl_seconds: int = 60
+
+    # Compiled quiz answer keys (TTL bounds staleness across workers)
+    answer_key_cache_max_entries: int = 10000
+    answer_key_cache_ttl_seconds: int = 600
+
+    # Questions written per transaction by the admin question-bank import
+    quiz_import_chunk_size: int = 500
+    # Longest NDJSON/CSV line accepted by the import (a line is buffered until its newline)
+    quiz_import_max_line_bytes: int = 1024 * 1024
+
     # CORS
     cors_allow_origins: List[AnyHttpUrl] = ['http://localhost:5173']
 
@@ -27,6 +83,35 @@ class Settings(BaseSettings):
     aws_secret_access_key: str | None = None
     aws_s3_bucket: str | None = None
 
+    # Streaming uploads: S3 multipart part size (min 5 MiB), parts in flight, per-part retries
+    storage_part_size: int = 8 * 1024 * 1024
+    storage_upload_concurrency: int = 4
+    storage_part_retries: int = 2
+    # Dedicated storage I/O threads (also the S3 connection pool size) and in-flight calls per backend
+    storage_io_workers: int = 16
+    storage_max_concurrency: int = 16
+    # Filesystem backend used when S3 is not configured
+    local_storage_dir: str = "storage"
+    local_storage_base_url: str = "/v1/files"
+    local_storage_upload_url: str = "/v1/uploads/local"
+    # Write-behind progress heartbeats (opt-in): buffer in memory, upsert every interval
+    progress_write_behind: bool = False
+    progress_flush_interval_seconds: int = 5
+    progress_flush_batch_size: int = 1000
+    # Entries buffered at most; when full, heartbeats for new (user, course) keys are written directly
+    progress_buffer_max_entries: int = 100_000
+
+    # Presigned direct-to-storage uploads
+    storage_presign_expires_seconds: int = 3600
+    storage_max_parts: int = 10000
+    # Largest object a presign request may declare (bounds the part URLs signed per request)
+    storage_presign_max_bytes: int = 20 * 1024 * 1024 * 1024
+
+    # Admin dashboard: metrics are recomputed in the background at most this often
+    dashboard_refresh_seconds: int = 300
+    # Most buckets one /admin/revenue request may return (a year of days, ~7 years of weeks)
+    revenue_max_buckets: int = 400
+
     stripe_api_key: str | None = None
 
     class Config:
@@ -42,5 +127,15 @@ class Settings(BaseSettings):
             f"@{self.postgres_server}/{self.postgres_db}"
         )
 
+    @property
+    def sqlalchemy_async_database_uri(self) -> str:
+        if self.database_url:
+            _, sep, rest = self.database_url.partition("://")
+            return f"postgresql+asyncpg{sep}{rest}"
+        return (
+            f"postgresql+asyncpg://{self.postgres_user}:{self.postgres_password}"
+            f"@{self.postgres_server}/{self.postgres_db}"
+        )
+
 
 settings = Settings()
@@ -0,0 +1,97 @@
+import logging
+import time
+from typing import Any, Optional
+
+from jose import jwk, jwt
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class KeyRing:
+    """JWT signing keys addressed by ``kid``.
+
+    The active key signs new tokens and stamps its ``kid`` in the header;
+    every configured key verifies. Rotation without downtime: add the new key
+    to every worker, switch ``active_kid`` to it, and drop the old key once
+    the last token it signed has expired.
+    """
+
+    def __init__(self, keys: dict[str, str], active_kid: str, algorithm: str, cache: TTLCache[dict[str, Any]]) -> None:
+        if active_kid not in keys:
+            raise ValueError(f"active JWT kid {active_kid!r} is not in the key ring")
+        self.algorithm = algorithm
+        self.active_kid = active_kid
+        # Key objects are built once instead of on every encode/decode
+        self._keys = {kid: jwk.construct(secret, algorithm) for kid, secret in keys.items()}
+        self._verified = cache
+
+    @property
+    def kids(self) -> list[str]:
+        return list(self._keys)
+
+    def sign(self, claims: dict[str, Any]) -> str:
+        return jwt.encode(
+            claims, self._keys[self.active_kid], algorithm=self.algorithm, headers={"kid": self.active_kid}
+        )
+
+    def verify(self, token: str) -> dict[str, Any]:
+        """Return the verified claims; raises JWTError.
+
+        Verified claims are cached per token string, so a hot token costs one
+        dict lookup plus the expiry check.
+        """
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims.get("exp") is not None and claims["exp"] <= time.time():
+                self._verified.pop(token)
+                raise ExpiredSignatureError("Signature has expired.")
+            return claims
+
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is not None:
+            key = self._keys.get(kid)
+            if key is None:
+                raise JWTError(f"unknown kid {kid!r}")
+            candidates = [key]
+        else:
+            # Tokens issued before kids existed: try every key
+            candidates = list(self._keys.values())
+
+        error: Optional[JWTError] = None
+        for key in candidates:
+            try:
+                claims = jwt.decode(token, key, algorithms=[self.algorithm])
+            except ExpiredSignatureError:
+                raise
+            except JWTError as e:
+                error = e
+                continue
+            self._verified.set(token, claims)
+            return claims
+        raise error or JWTError("no verification key")
+
+
+def build_key_ring() -> KeyRing:
+    keys = dict(settings.jwt_signing_keys)
+    active_kid = settings.jwt_active_kid
+    if not keys:
+        if "secret_key" not in settings.model_fields_set:
+            logger.warning(
+                "No JWT_SIGNING_KEYS or SECRET_KEY configured; using a per-process random key. "
+                "Tokens will not validate across workers or restarts."
+            )
+        keys = {"default": settings.secret_key}
+        active_kid = active_kid or "default"
+    elif active_kid is None:
+        active_kid = next(iter(keys))
+    cache: TTLCache[dict[str, Any]] = TTLCache(
+        settings.jwt_verify_cache_max_entries, settings.jwt_verify_cache_ttl_seconds
+    )
+    return KeyRing(keys, active_kid, settings.algorithm, cache)
+
+
+key_ring = build_key_ring()
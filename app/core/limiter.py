@@ -0,0 +1,23 @@
+from typing import Any
+
+from anyio import to_thread
+
+from app.core.config import settings
+
+
+def configure_thread_limiter() -> None:
+    """Size the AnyIO limiter that caps concurrently running sync handlers.
+
+    Must be called from inside the running event loop (e.g. app lifespan).
+    """
+    to_thread.current_default_thread_limiter().total_tokens = settings.sync_handler_concurrency
+
+
+def thread_limiter_status() -> dict[str, Any]:
+    limiter = to_thread.current_default_thread_limiter()
+    stats = limiter.statistics()
+    return {
+        "total_tokens": int(limiter.total_tokens),
+        "borrowed_tokens": stats.borrowed_tokens,
+        "tasks_waiting": stats.tasks_waiting,
+    }
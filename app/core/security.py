@@ -1,12 +1,26 @@
+import asyncio
+import multiprocessing
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
-from jose import jwt
+from fastapi.concurrency import run_in_threadpool
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.keyring import key_ring
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the configured cost makes verify_and_update()
+# flag hashes made with any other cost, so changing BCRYPT_ROUNDS rehashes
+# users transparently on their next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.bcrypt_rounds,
+    bcrypt__min_rounds=settings.bcrypt_rounds,
+    bcrypt__max_rounds=settings.bcrypt_rounds,
+)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
@@ -16,9 +30,80 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
-def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
+def verify_and_update_password(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing queue is full; mapped to 503 by the app."""
+
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated process pool with bounded admission.
+
+    At most ``max_pending`` hash/verify calls may be queued or running; any
+    more fail fast with PasswordHasherBusy instead of piling up behind a
+    login burst. With ``workers`` set to 0 the work runs on the threadpool.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+
+    def start(self) -> None:
+        if self.workers > 0 and self._executor is None:
+            # spawn: never fork a process that already runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self._pending >= self.max_pending:
+            raise PasswordHasherBusy()
+        self._pending += 1
+        try:
+            if self.workers <= 0:
+                return await run_in_threadpool(fn, *args)
+            self.start()
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+        """Verify, also returning a fresh hash when the stored one uses another cost."""
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
+
+
+def issue_access_token(subject: str, expires_minutes: Optional[int] = None) -> tuple[str, str, datetime]:
+    """Create a signed token; returns (token, jti, expires_at)."""
     if expires_minutes is None:
         expires_minutes = settings.access_token_expire_minutes
     expire = datetime.now(tz=timezone.utc) + timedelta(minutes=expires_minutes)
-    to_encode: dict[str, Any] = {"exp": expire, "sub": str(subject)}
-    return jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
+    jti = uuid.uuid4().hex
+    to_encode: dict[str, Any] = {"exp": expire, "sub": str(subject), "jti": jti}
+    return key_ring.sign(to_encode), jti, expire
+
+
+def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
+    return issue_access_token(subject, expires_minutes)[0]
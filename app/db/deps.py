@@ -1,14 +1,18 @@
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, Generator
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from app.db.session import SessionLocal
+from app.db.session import AsyncSessionLocal, SessionLocal
 
 
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
-        print("Database connection opened")
     finally:
         db.close()
-        print("Database connection closed")
\ No newline at end of file
+
+
+async def get_async_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
+        yield db
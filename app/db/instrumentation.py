@@ -0,0 +1,132 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|\$\d+|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+class RequestDbStats:
+    """Statement counts and timings collected for a single request."""
+
+    __slots__ = ("queries", "db_seconds", "checkouts", "checkout_wait_seconds", "shapes")
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.checkouts = 0
+        self.checkout_wait_seconds = 0.0
+        self.shapes: Counter[str] = Counter()
+
+
+_request_stats: ContextVar[Optional[RequestDbStats]] = ContextVar("request_db_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    # Bound parameters already strip literal values; collapse expanded IN
+    # lists so `IN (?, ?)` and `IN (?, ?, ?)` count as the same statement.
+    return _PLACEHOLDER_LIST.sub("?", _PLACEHOLDER.sub("?", statement))
+
+
+def record_checkout_wait(seconds: float) -> None:
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.checkouts += 1
+        stats.checkout_wait_seconds += seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _request_stats.get()
+    starts = conn.info.get("query_start")
+    if stats is None or not starts:
+        return
+    stats.queries += 1
+    stats.db_seconds += time.perf_counter() - starts.pop()
+    stats.shapes[statement_shape(statement)] += 1
+
+
+def install_query_listeners(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class DbInstrumentationMiddleware:
+    """Per-request DB metrics: Server-Timing header, log line, N+1 warnings."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDbStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                    f"db-wait;dur={stats.checkout_wait_seconds * 1000:.1f}",
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            self._report(scope, status_code, stats, time.perf_counter() - start)
+
+    def _report(self, scope: Scope, status_code: int, stats: RequestDbStats, elapsed: float) -> None:
+        route = scope.get("route")
+        path = getattr(route, "path", scope["path"])
+        method = scope["method"]
+        logger.info(
+            "%s %s status=%d total_ms=%.1f db_queries=%d db_ms=%.1f db_checkouts=%d db_wait_ms=%.1f",
+            method, path, status_code, elapsed * 1000, stats.queries, stats.db_seconds * 1000,
+            stats.checkouts, stats.checkout_wait_seconds * 1000,
+            extra={
+                "http_method": method,
+                "route": path,
+                "status_code": status_code,
+                "total_ms": round(elapsed * 1000, 3),
+                "db_queries": stats.queries,
+                "db_ms": round(stats.db_seconds * 1000, 3),
+                "db_checkouts": stats.checkouts,
+                "db_wait_ms": round(stats.checkout_wait_seconds * 1000, 3),
+            },
+        )
+        threshold = settings.db_n_plus_one_threshold
+        if threshold <= 0:
+            return
+        for shape, count in stats.shapes.items():
+            if count > threshold:
+                logger.warning(
+                    "possible N+1: %s %s ran the same statement %d times: %s",
+                    method, path, count, shape,
+                    extra={"route": path, "statement": shape, "count": count},
+                )
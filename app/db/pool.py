@@ -0,0 +1,84 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Any
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.db.instrumentation import record_checkout_wait
+
+# Upper bounds (ms) of the checkout wait-time histogram buckets; the last
+# bucket collects everything slower.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+
+
+class WaitHistogram:
+    """Thread-safe histogram of connection checkout wait times."""
+
+    def __init__(self, buckets_ms: tuple[float, ...] = WAIT_BUCKETS_MS) -> None:
+        self.buckets_ms = buckets_ms
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(buckets_ms) + 1)
+        self._total_ms = 0.0
+        self._max_ms = 0.0
+        self._timeouts = 0
+
+    def observe(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        with self._lock:
+            self._counts[bisect_left(self.buckets_ms, ms)] += 1
+            self._total_ms += ms
+            if ms > self._max_ms:
+                self._max_ms = ms
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self._timeouts += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "buckets_ms": list(self.buckets_ms),
+                "counts": list(self._counts),
+                "count": sum(self._counts),
+                "total_ms": round(self._total_ms, 3),
+                "max_ms": round(self._max_ms, 3),
+                "timeouts": self._timeouts,
+            }
+
+
+class _WaitTimingMixin:
+    wait_histogram: WaitHistogram
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.wait_histogram.record_timeout()
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            self.wait_histogram.observe(waited)
+            record_checkout_wait(waited)
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    wait_histogram = WaitHistogram()
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    wait_histogram = WaitHistogram()
+
+
+def pool_status(pool: QueuePool) -> dict[str, Any]:
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+        "timeout_seconds": pool.timeout(),
+        "wait": getattr(pool, "wait_histogram", WaitHistogram()).snapshot(),
+    }
@@ -1,7 +1,33 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
+from app.db.instrumentation import install_query_listeners
+from app.db.pool import InstrumentedAsyncQueuePool, InstrumentedQueuePool
 
-engine = create_engine(settings.sqlalchemy_database_uri, pool_pre_ping=True)
+pool_options = dict(
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_recycle=settings.db_pool_recycle,
+    pool_pre_ping=settings.db_pool_pre_ping,
+)
+
+engine = create_engine(settings.sqlalchemy_database_uri, poolclass=InstrumentedQueuePool, **pool_options)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Native async engine (asyncpg) for the hot request paths; the sync engine
+# above stays in use for the CLI and the admin routes.
+async_engine = create_async_engine(
+    settings.sqlalchemy_async_database_uri, poolclass=InstrumentedAsyncQueuePool, **pool_options
+)
+install_query_listeners(engine)
+install_query_listeners(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
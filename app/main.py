@@ -1,11 +1,117 @@
-from fastapi import FastAPI
+import asyncio
+import inspect
+import logging
+import os
+from contextlib import asynccontextmanager, suppress
+from typing import Any, Callable
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from fastapi.staticfiles import StaticFiles
 
 from app.core.config import settings
+from app.core.limiter import configure_thread_limiter, thread_limiter_status
+from app.core.security import PasswordHasherBusy, password_hasher
+from app.db.instrumentation import DbInstrumentationMiddleware
+from app.db.pool import pool_status
+from app.db.session import async_engine, engine
+from app.services.catalog import course_catalog
+from app.services.course_media import course_media
+from app.services.dashboard import dashboard_metrics
+from app.services.progress_buffer import progress_buffer
+from app.services.revocation import token_denylist
+from app.services.storage import storage_service
+from app.services.token_store import purge_expired_tokens
 from app.api.v1.router import api_router
 from app.api.v1.routes import auth as auth_routes
 
-app = FastAPI(title="Learning Platform API", version="1.0.0")
+logger = logging.getLogger(__name__)
+
+
+def log_pool_stats() -> None:
+    sync_pool = pool_status(engine.pool)
+    async_pool = pool_status(async_engine.pool)
+    limiter = thread_limiter_status()
+    logger.info(
+        "db pool sync=%d/%d+%d (waits=%d timeouts=%d max_wait_ms=%.1f) "
+        "async=%d/%d+%d (waits=%d timeouts=%d max_wait_ms=%.1f) "
+        "threads=%d/%d waiting=%d",
+        sync_pool["checked_out"], sync_pool["size"], sync_pool["overflow"],
+        sync_pool["wait"]["count"], sync_pool["wait"]["timeouts"], sync_pool["wait"]["max_ms"],
+        async_pool["checked_out"], async_pool["size"], async_pool["overflow"],
+        async_pool["wait"]["count"], async_pool["wait"]["timeouts"], async_pool["wait"]["max_ms"],
+        limiter["borrowed_tokens"], limiter["total_tokens"], limiter["tasks_waiting"],
+    )
+
+
+async def run_periodically(interval: int, job: Callable[[], Any]) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = job()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("periodic job %s failed", getattr(job, "__qualname__", job))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_thread_limiter()
+    password_hasher.start()
+    try:
+        await course_catalog.reload()
+    except Exception:
+        # Catalog reads fall back to the database until the next refresh succeeds
+        logger.exception("initial course catalog load failed")
+    try:
+        await course_media.reload()
+    except Exception:
+        # Misses fall back to reading the course row
+        logger.exception("initial course media index load failed")
+    try:
+        await token_denylist.sync()
+    except Exception:
+        logger.exception("initial token denylist sync failed")
+    try:
+        await dashboard_metrics.refresh()
+    except Exception:
+        # The dashboard computes on first request instead
+        logger.exception("initial dashboard metrics load failed")
+
+    periodic: list[tuple[int, Callable[[], Any]]] = [
+        (settings.db_pool_stats_log_interval_seconds, log_pool_stats),
+        (settings.course_catalog_refresh_seconds, course_catalog.reload),
+        (settings.course_catalog_refresh_seconds, course_media.reload),
+        (settings.token_purge_interval_seconds, purge_expired_tokens),
+        (settings.token_revocation_sync_seconds, token_denylist.sync),
+        (settings.dashboard_refresh_seconds, dashboard_metrics.refresh),
+    ]
+    if progress_buffer.enabled:
+        periodic.append((settings.progress_flush_interval_seconds, progress_buffer.flush))
+    tasks = [
+        asyncio.create_task(run_periodically(interval, job))
+        for interval, job in periodic
+        if interval > 0
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    try:
+        # Buffered heartbeats must reach the database before the engines go away
+        await progress_buffer.flush()
+    except Exception:
+        logger.exception("final progress buffer flush failed (%d rows lost)", len(progress_buffer))
+    password_hasher.shutdown()
+    await asyncio.to_thread(storage_service.shutdown)
+    await async_engine.dispose()
+    engine.dispose()
+
+
+app = FastAPI(title="Learning Platform API", version="1.0.0", lifespan=lifespan)
 
 
 # origins = [
@@ -21,7 +127,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(DbInstrumentationMiddleware)
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": {"error": 503, "message": "混み合っています。しばらくしてから再度お試しください", "details": {}}},
+        headers={"Retry-After": "1"},
+    )
 
 @app.get("/healthz")
 async def health_check():
@@ -29,3 +145,7 @@ async def health_check():
 
 # Versioned API
 app.include_router(api_router, prefix=settings.api_v1_prefix)
+
+# Avatars saved before the storage service handled them point at /static/avatars/...
+if os.path.isdir("public"):
+    app.mount("/static", StaticFiles(directory="public"), name="static")
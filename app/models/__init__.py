@@ -1,6 +1,6 @@
 from app.db.base import Base
 
-from app.models.user import User  # noqa: F401
+from app.models.user import User, UserStats  # noqa: F401
 from app.models.subscription_plan import SubscriptionPlan, UserSubscription  # noqa: F401
 from app.models.course import (
     CourseCategory,
@@ -11,3 +11,6 @@ from app.models.course import (
 )  # noqa: F401
 from app.models.quiz import Quiz, QuizQuestion, QuizQuestionOption, UserQuizAttempt, UserQuizAnswer  # noqa: F401
 from app.models.purchase import CoursePurchase, UserAchievement, Notification  # noqa: F401
+from app.models.token import PasswordResetToken, RevokedToken  # noqa: F401
+from app.models.dashboard import DashboardMetric  # noqa: F401
+from app.models.revenue import RevenueDaily  # noqa: F401
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, Enum, ForeignKey, DateTime
+from sqlalchemy import ARRAY, Column, Integer, String, Text, Boolean, Enum, ForeignKey, DateTime, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
@@ -47,6 +47,9 @@ class Course(Base):
     status = Column(Enum(PublishStatus), default=PublishStatus.draft, nullable=False)
     estimated_duration_minutes = Column(Integer, default=0, nullable=False)
     sort_order = Column(Integer, default=0, nullable=False)
+    # Denormalized from course_videos on every video change (see services.course_media)
+    total_duration_seconds = Column(Integer, default=0, server_default="0", nullable=False)
+    video_ids = Column(ARRAY(Integer), default=list, server_default="{}", nullable=False)
 
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -55,6 +58,11 @@ class Course(Base):
     category = relationship("CourseCategory", back_populates="courses")
     videos = relationship("CourseVideo", back_populates="course")
 
+    __table_args__ = (
+        # Matches the catalog ORDER BY so keyset pages are index range scans
+        Index("ix_courses_catalog_order", "sort_order", id.desc()),
+    )
+
 
 class CourseVideo(Base):
     __tablename__ = "course_videos"
@@ -88,6 +96,11 @@ class UserCourseProgress(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
+    __table_args__ = (
+        # One row per user and course; the ON CONFLICT target for buffered progress upserts
+        UniqueConstraint("user_id", "course_id", name="uq_user_course_progress_user_course"),
+    )
+
 
 class UserVideoProgress(Base):
     __tablename__ = "user_video_progress"
@@ -96,7 +109,14 @@ class UserVideoProgress(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     video_id = Column(Integer, ForeignKey("course_videos.id"), nullable=False, index=True)
     watched_seconds = Column(Integer, default=0, nullable=False)
+    # Resume point from the most recent heartbeat
+    position_seconds = Column(Integer, default=0, server_default="0", nullable=False)
     is_completed = Column(Boolean, default=False, nullable=False)
     last_watched_at = Column(DateTime(timezone=True), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    __table_args__ = (
+        # ON CONFLICT target for batched heartbeat upserts
+        UniqueConstraint("user_id", "video_id", name="uq_user_video_progress_user_video"),
+    )
@@ -0,0 +1,13 @@
+from sqlalchemy import JSON, Column, DateTime, String
+
+from app.db.base import Base
+
+
+class DashboardMetric(Base):
+    """Latest value of each admin dashboard metric, written by the background refresher."""
+
+    __tablename__ = "dashboard_metrics"
+
+    name = Column(String(100), primary_key=True)
+    value = Column(JSON, nullable=True)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
@@ -68,7 +68,8 @@ class UserQuizAttempt(Base):
 
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
-    quiz_id = Column(Integer, ForeignKey("quizzes.id"), nullable=False, index=True)
+    # NULL once the quiz is deleted; the attempt itself is kept as learner history
+    quiz_id = Column(Integer, ForeignKey("quizzes.id", ondelete="SET NULL"), nullable=True, index=True)
     score = Column(Integer, default=0, nullable=False)
     total_questions = Column(Integer, default=0, nullable=False)
     correct_answers = Column(Integer, default=0, nullable=False)
@@ -84,8 +85,9 @@ class UserQuizAnswer(Base):
 
     id = Column(Integer, primary_key=True)
     attempt_id = Column(Integer, ForeignKey("user_quiz_attempts.id"), nullable=False, index=True)
-    question_id = Column(Integer, ForeignKey("quiz_questions.id"), nullable=False, index=True)
-    selected_option_id = Column(Integer, ForeignKey("quiz_question_options.id"), nullable=False)
+    # NULL once the question/option is replaced or deleted
+    question_id = Column(Integer, ForeignKey("quiz_questions.id", ondelete="SET NULL"), nullable=True, index=True)
+    selected_option_id = Column(Integer, ForeignKey("quiz_question_options.id", ondelete="SET NULL"), nullable=True)
     is_correct = Column(Boolean, default=False, nullable=False)
     answered_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
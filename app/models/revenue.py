@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Date, DateTime, Integer, Numeric, String
+from sqlalchemy.sql import func
+
+from app.db.base import Base
+
+
+class RevenueDaily(Base):
+    """Revenue per UTC day and source, kept current by services.revenue on every billing write."""
+
+    __tablename__ = "revenue_daily"
+
+    day = Column(Date, primary_key=True)
+    # "subscription", "course_purchase" or "purchase"
+    source = Column(String(20), primary_key=True)
+    amount = Column(Numeric(14, 2), default=0, server_default="0", nullable=False)
+    transactions = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import BigInteger, Column, ForeignKey, String, DateTime
+from sqlalchemy import BigInteger, Column, ForeignKey, LargeBinary, String, DateTime
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.db.base import Base
@@ -8,8 +8,21 @@ class PasswordResetToken(Base):
 
     id = Column(BigInteger, primary_key=True, index=True, autoincrement=True)
     user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    token = Column(String, unique=True, index=True, nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    # SHA-256 of the issued token: fixed 32 bytes instead of the full JWT string
+    token_hash = Column(LargeBinary(32), unique=True, nullable=False)
+    jti = Column(String(32), nullable=True, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    user = relationship("User", back_populates="password_reset_tokens")
\ No newline at end of file
+    user = relationship("User", back_populates="password_reset_tokens")
+
+
+class RevokedToken(Base):
+    """Denylisted token ids; every worker mirrors the unexpired rows in memory."""
+
+    __tablename__ = "revoked_tokens"
+
+    jti = Column(String(32), primary_key=True)
+    user_id = Column(BigInteger, nullable=True, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    revoked_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
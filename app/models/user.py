@@ -1,4 +1,4 @@
-from sqlalchemy import Column, BigInteger, Identity, String, Boolean, DateTime
+from sqlalchemy import Column, BigInteger, Identity, Integer, String, Boolean, Date, DateTime, ForeignKey
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -24,4 +24,33 @@ class User(Base):
 
     # relationships
     subscriptions = relationship("UserSubscription", back_populates="user")
-    password_reset_tokens = relationship("PasswordResetToken", back_populates="user")
\ No newline at end of file
+    # Issued-token rows go with the user (the FK cascades in the database)
+    password_reset_tokens = relationship(
+        "PasswordResetToken", back_populates="user", cascade="all, delete-orphan", passive_deletes=True
+    )
+
+
+class UserStats(Base):
+    """Per-user learning totals, updated in the same transaction as progress and quiz writes.
+
+    ``python -m app.cli rebuild-user-stats`` recomputes every row from the
+    source tables.
+    """
+
+    __tablename__ = "user_stats"
+
+    user_id = Column(BigInteger, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    courses_started = Column(Integer, default=0, server_default="0", nullable=False)
+    courses_completed = Column(Integer, default=0, server_default="0", nullable=False)
+    total_watch_seconds = Column(BigInteger, default=0, server_default="0", nullable=False)
+    quiz_attempts = Column(Integer, default=0, server_default="0", nullable=False)
+    quizzes_passed = Column(Integer, default=0, server_default="0", nullable=False)
+    # Sum of attempt scores; average = score_total / quiz_attempts
+    score_total = Column(BigInteger, default=0, server_default="0", nullable=False)
+    current_streak_days = Column(Integer, default=0, server_default="0", nullable=False)
+    longest_streak_days = Column(Integer, default=0, server_default="0", nullable=False)
+    # UTC calendar day of the latest recorded activity
+    last_active_on = Column(Date, nullable=True)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
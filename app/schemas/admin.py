@@ -1,5 +1,5 @@
-from datetime import datetime
-from typing import List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 from app.schemas.user import UserOut, UserUpdate
 
@@ -17,5 +17,54 @@ class AdminDashboardOut(BaseModel):
     total_users: int
     total_courses: int
     active_subscriptions: int
-    total_revenue: int
+    total_revenue: float
     monthly_growth: float
+    # When the snapshot was computed; every registered metric is listed in ``metrics``
+    as_of: Optional[datetime] = None
+    metrics: Dict[str, Any] = {}
+
+
+class RevenueBucketOut(BaseModel):
+    start: date
+    amount: float
+    transactions: int
+    by_source: Dict[str, float] = {}
+
+
+class RevenueSeriesOut(BaseModel):
+    bucket: str
+    start: date
+    end: date
+    total_amount: float
+    buckets: List[RevenueBucketOut]
+
+
+class PoolWaitHistogramOut(BaseModel):
+    buckets_ms: List[float]
+    counts: List[int]
+    count: int
+    total_ms: float
+    max_ms: float
+    timeouts: int
+
+
+class ConnectionPoolOut(BaseModel):
+    size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    timeout_seconds: float
+    wait: PoolWaitHistogramOut
+
+
+class ThreadLimiterOut(BaseModel):
+    total_tokens: int
+    borrowed_tokens: int
+    tasks_waiting: int
+
+
+class PoolStatsOut(BaseModel):
+    sync_pool: ConnectionPoolOut
+    async_pool: ConnectionPoolOut
+    thread_limiter: ThreadLimiterOut
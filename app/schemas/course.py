@@ -1,6 +1,6 @@
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, Field, HttpUrl, field_validator
 from typing import Optional, List
-from datetime import datetime
+from datetime import datetime, timezone
 from app.models.course import DifficultyLevel, PublishStatus
 
 
@@ -45,9 +45,13 @@ class CourseUpdate(BaseModel):
     category_id: Optional[int] = None
 
 class CourseOut(CourseBase):
+    # Stored URLs may be relative (local storage serves them under /v1/files)
+    video_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     id: int
     category_name: Optional[str] = None
     estimated_duration_minutes: Optional[int] = None
+    total_duration_seconds: Optional[int] = None
     created_at: datetime
     updated_at: datetime
 
@@ -75,6 +79,12 @@ class UserProgressOut(BaseModel):
     completed_at: Optional[datetime] = None
 
 
+class MyCourseProgressOut(UserProgressOut):
+    title: str
+    thumbnail_url: Optional[str] = None
+    total_duration_seconds: int = 0
+
+
 class CourseDetailOut(CourseOut):
     user_progress: Optional[UserProgressOut] = None
 
@@ -84,8 +94,43 @@ class CourseProgressUpdateIn(BaseModel):
     watched_seconds: int
     is_completed: bool
 
+class VideoHeartbeatEventIn(BaseModel):
+    video_id: int
+    position_seconds: int = Field(0, ge=0)
+    watched_delta_seconds: int = Field(0, ge=0, le=3600)
+    completed: bool = False
+    occurred_at: Optional[datetime] = None
+
+    @field_validator("occurred_at")
+    @classmethod
+    def normalize_occurred_at(cls, value: Optional[datetime]) -> Optional[datetime]:
+        # Naive times are taken as UTC; device clocks running ahead are clamped to now
+        if value is None:
+            return None
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return min(value, datetime.now(timezone.utc))
+
+
+class VideoHeartbeatBatchIn(BaseModel):
+    events: List[VideoHeartbeatEventIn] = Field(..., min_length=1, max_length=500)
+
+
+class VideoProgressOut(BaseModel):
+    video_id: int
+    watched_seconds: int
+    position_seconds: int
+    is_completed: bool
+
+
+class VideoHeartbeatBatchOut(BaseModel):
+    accepted_events: int
+    videos: List[VideoProgressOut]
+    progress: UserProgressOut
+
 class CourseListResponse(BaseModel):
     courses: List[CourseOut]
-    total_count: int
-    current_page: int
-    total_pages: int
+    total_count: Optional[int] = None
+    current_page: Optional[int] = None
+    total_pages: Optional[int] = None
+    next_cursor: Optional[str] = None
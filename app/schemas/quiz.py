@@ -27,6 +27,7 @@ class QuestionResultOut(BaseModel):
     question_id: int
     is_correct: bool
     correct_answer: int
+    correct_option_ids: List[int] = []
 
 
 class QuizSubmissionIn(BaseModel):
@@ -34,6 +35,7 @@ class QuizSubmissionIn(BaseModel):
 
 
 class QuizSubmissionOut(BaseModel):
+    attempt_id: Optional[int] = None
     score: int
     total_questions: int
     correct_answers: int
@@ -125,3 +127,17 @@ class QuizOut(BaseModel):
 
 class QuizDeleteResponse(BaseModel):
     message: str
+
+
+class QuizImportChunkOut(BaseModel):
+    chunk: int
+    questions: int
+    options: int
+    elapsed_ms: float
+
+
+class QuizImportOut(BaseModel):
+    quiz_id: int
+    total_questions: int
+    total_options: int
+    chunks: List[QuizImportChunkOut]
@@ -0,0 +1,46 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field
+
+from app.core.config import settings
+
+
+class PresignUploadIn(BaseModel):
+    size: int = Field(..., gt=0, le=settings.storage_presign_max_bytes, description="バイト数")
+    content_type: Optional[str] = None
+    checksum_sha256: Optional[str] = Field(None, description="Base64 エンコードした SHA-256")
+
+
+class PresignedPartOut(BaseModel):
+    part_number: int
+    url: str
+
+
+class PresignUploadOut(BaseModel):
+    ticket: str
+    key: str
+    method: str
+    # Single PUT: url + headers. Multipart: upload_id, part_size and one URL per part.
+    url: Optional[str] = None
+    headers: Dict[str, str] = {}
+    upload_id: Optional[str] = None
+    part_size: Optional[int] = None
+    # e.g. "SHA256": send each part with x-amz-checksum-sha256 (base64 digest of that part)
+    part_checksum: Optional[str] = None
+    parts: List[PresignedPartOut] = []
+    expires_at: datetime
+
+
+class CompletedPartIn(BaseModel):
+    part_number: int
+    etag: str
+
+
+class CompleteUploadIn(BaseModel):
+    ticket: str
+    parts: Optional[List[CompletedPartIn]] = None
+
+
+class CompleteUploadOut(BaseModel):
+    url: str
+    size: int
@@ -1,7 +1,7 @@
 import email
 from pydantic import BaseModel, HttpUrl
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 
 class UserBase(BaseModel):
@@ -45,6 +45,17 @@ class UpdatePassword(BaseModel):
     current_password: str
     new_password: str
 
+class UserStatsOut(BaseModel):
+    courses_started: int = 0
+    courses_completed: int = 0
+    total_watch_seconds: int = 0
+    quiz_attempts: int = 0
+    quizzes_passed: int = 0
+    average_score: Optional[float] = None
+    current_streak_days: int = 0
+    longest_streak_days: int = 0
+    last_active_on: Optional[date] = None
+
 # --- New wrapper for the register/login response ---
 class AuthResponse(BaseModel):
     user: UserOut          # nested user info
@@ -58,3 +69,5 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
+    jti: Optional[str] = None
+    exp: Optional[int] = None
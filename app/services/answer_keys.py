@@ -0,0 +1,158 @@
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.quiz import Quiz, QuizQuestion, QuizQuestionOption
+
+
+class GradeResult:
+    __slots__ = ("score", "total_questions", "correct_answers", "is_passed", "results", "selections")
+
+    def __init__(
+        self,
+        score: int,
+        total_questions: int,
+        correct_answers: int,
+        is_passed: bool,
+        results: list[dict],
+        selections: list[tuple[int, int, bool]],
+    ):
+        self.score = score
+        self.total_questions = total_questions
+        self.correct_answers = correct_answers
+        self.is_passed = is_passed
+        self.results = results
+        # (question_id, selected_option_id, question graded correct) for questions in this quiz
+        self.selections = selections
+
+
+class CompiledAnswerKey:
+    """Everything needed to grade a quiz without touching the database."""
+
+    __slots__ = ("quiz_id", "version", "status", "passing_score", "question_ids", "correct")
+
+    def __init__(
+        self,
+        quiz_id: int,
+        version: int,
+        status: str,
+        passing_score: int,
+        question_ids: tuple[int, ...],
+        correct: dict[int, frozenset[int]],
+    ) -> None:
+        self.quiz_id = quiz_id
+        self.version = version
+        self.status = status
+        self.passing_score = passing_score
+        self.question_ids = question_ids
+        self.correct = correct
+
+    def grade(self, answers: Iterable[tuple[int, int]]) -> GradeResult:
+        """Grade (question_id, selected_option_id) pairs.
+
+        A question may be answered by several pairs; it counts as correct when
+        the selected options equal its full set of correct options, so
+        multiple-correct questions are graded as "select all that apply".
+        """
+        selected: dict[int, set[int]] = {}
+        for qid, oid in answers:
+            selected.setdefault(qid, set()).add(oid)
+
+        question_set = set(self.question_ids)
+        correct_count = 0
+        results = []
+        selections = []
+        for qid, chosen in selected.items():
+            expected = self.correct.get(qid, frozenset())
+            is_correct = bool(expected) and chosen == expected
+            if is_correct:
+                correct_count += 1
+            ordered = sorted(expected)
+            results.append({
+                "question_id": qid,
+                "is_correct": is_correct,
+                "correct_answer": ordered[0] if ordered else 0,
+                "correct_option_ids": ordered,
+            })
+            if qid in question_set:
+                selections.extend((qid, oid, is_correct) for oid in sorted(chosen))
+
+        total = len(self.question_ids)
+        score = int((correct_count / total) * 100) if total else 0
+        return GradeResult(score, total, correct_count, score >= self.passing_score, results, selections)
+
+
+class AnswerKeyCache:
+    """Per-quiz compiled answer keys, loaded once and dropped on admin writes.
+
+    Every invalidation bumps the quiz's version so a load that raced with an
+    admin write is discarded instead of caching stale answers.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._lock = threading.Lock()
+        self._keys: TTLCache[CompiledAnswerKey] = TTLCache(max_entries, ttl_seconds)
+        self._versions: dict[int, int] = {}
+
+    def invalidate(self, quiz_id: int) -> None:
+        with self._lock:
+            self._keys.pop(quiz_id)
+            self._versions[quiz_id] = self._versions.get(quiz_id, 0) + 1
+
+    async def get(self, db: AsyncSession, quiz_id: int) -> Optional[CompiledAnswerKey]:
+        with self._lock:
+            version = self._versions.get(quiz_id, 0)
+            cached = self._keys.get(quiz_id)
+        if cached is not None:
+            return cached
+
+        key = await self._load(db, quiz_id, version)
+        if key is None:
+            return None
+        with self._lock:
+            if self._versions.get(quiz_id, 0) == version:
+                self._keys.set(quiz_id, key)
+        return key
+
+    @staticmethod
+    async def _load(db: AsyncSession, quiz_id: int, version: int) -> Optional[CompiledAnswerKey]:
+        # One round trip: quiz row, every question, and the correct options (if any)
+        rows = (
+            await db.execute(
+                select(Quiz.status, Quiz.passing_score_percentage, QuizQuestion.id, QuizQuestionOption.id)
+                .select_from(Quiz)
+                .outerjoin(QuizQuestion, QuizQuestion.quiz_id == Quiz.id)
+                .outerjoin(
+                    QuizQuestionOption,
+                    and_(QuizQuestionOption.question_id == QuizQuestion.id, QuizQuestionOption.is_correct == True),
+                )
+                .where(Quiz.id == quiz_id)
+            )
+        ).all()
+        if not rows:
+            return None
+
+        status, passing_score = rows[0][0], rows[0][1] or 0
+        question_ids: dict[int, None] = {}
+        correct: dict[int, set[int]] = {}
+        for _, _, qid, oid in rows:
+            if qid is None:
+                continue
+            question_ids[qid] = None
+            if oid is not None:
+                correct.setdefault(qid, set()).add(oid)
+        return CompiledAnswerKey(
+            quiz_id=quiz_id,
+            version=version,
+            status=status,
+            passing_score=passing_score,
+            question_ids=tuple(question_ids),
+            correct={qid: frozenset(oids) for qid, oids in correct.items()},
+        )
+
+
+answer_key_cache = AnswerKeyCache(settings.answer_key_cache_max_entries, settings.answer_key_cache_ttl_seconds)
@@ -0,0 +1,159 @@
+import logging
+import threading
+import time
+from bisect import bisect_right
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.course import Course, DifficultyLevel, PublishStatus
+from app.schemas.course import CourseOut
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """Immutable view of the non-archived catalog, sorted by (sort_order, -id).
+
+    Filters are Python-int bitsets over positions in ``courses``: bit ``i`` is
+    set when ``courses[i]`` has that attribute value.
+    """
+
+    __slots__ = ("courses", "keys", "all_mask", "by_category", "by_difficulty", "by_premium", "built_at")
+
+    def __init__(self, courses: list[CourseOut], keys: list[tuple[int, int]]) -> None:
+        self.courses = courses
+        self.keys = keys
+        self.all_mask = (1 << len(courses)) - 1
+        self.by_category: dict[Optional[int], int] = {}
+        self.by_difficulty: dict[DifficultyLevel, int] = {}
+        self.by_premium: dict[bool, int] = {}
+        for pos, course in enumerate(courses):
+            bit = 1 << pos
+            self.by_category[course.category_id] = self.by_category.get(course.category_id, 0) | bit
+            self.by_difficulty[course.difficulty] = self.by_difficulty.get(course.difficulty, 0) | bit
+            self.by_premium[course.is_premium] = self.by_premium.get(course.is_premium, 0) | bit
+        self.built_at = time.time()
+
+
+class CourseCatalog:
+    """In-process course catalog answering list filters without touching the DB."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._entries: dict[int, tuple[tuple[int, int], CourseOut]] = {}
+        self._snapshot: Optional[CatalogSnapshot] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    def load(self, courses: Iterable[Course]) -> None:
+        with self._lock:
+            self._entries = {}
+            for course in courses:
+                if course.status != PublishStatus.archived:
+                    self._entries[course.id] = self._entry(course)
+            self._rebuild()
+
+    def upsert(self, course: Course) -> None:
+        with self._lock:
+            if course.status == PublishStatus.archived:
+                self._entries.pop(course.id, None)
+            else:
+                self._entries[course.id] = self._entry(course)
+            self._rebuild()
+
+    def update_durations(self, durations: dict[int, tuple[int, int]]) -> None:
+        """Apply recomputed (total_duration_seconds, estimated_duration_minutes) to cached courses."""
+        with self._lock:
+            changed = False
+            for course_id, (total, minutes) in durations.items():
+                entry = self._entries.get(course_id)
+                if entry is None:
+                    continue
+                key, course = entry
+                self._entries[course_id] = key, course.model_copy(
+                    update={"total_duration_seconds": total, "estimated_duration_minutes": minutes}
+                )
+                changed = True
+            if changed:
+                self._rebuild()
+
+    def remove(self, course_id: int) -> None:
+        with self._lock:
+            if self._entries.pop(course_id, None) is not None:
+                self._rebuild()
+
+    async def reload(self) -> None:
+        async with AsyncSessionLocal() as db:
+            courses = (await db.scalars(select(Course).where(Course.status != PublishStatus.archived))).all()
+        self.load(courses)
+
+    def query(
+        self,
+        *,
+        category_id: Optional[int] = None,
+        difficulty: Optional[DifficultyLevel] = None,
+        is_premium: Optional[bool] = None,
+        offset: int = 0,
+        limit: int = 20,
+        after: Optional[tuple[int, int]] = None,
+    ) -> tuple[list[CourseOut], int, Optional[tuple[int, int]]]:
+        """Return (page, total matching, keyset of the last row if more remain).
+
+        ``after`` is a (sort_order, id) keyset; rows up to and including it are
+        skipped and ``offset`` is ignored.
+        """
+        snap = self._snapshot
+        if snap is None:
+            raise RuntimeError("catalog not loaded")
+
+        mask = snap.all_mask
+        if category_id is not None:
+            mask &= snap.by_category.get(category_id, 0)
+        if difficulty is not None:
+            mask &= snap.by_difficulty.get(difficulty, 0)
+        if is_premium is not None:
+            mask &= snap.by_premium.get(is_premium, 0)
+        total = mask.bit_count()
+
+        if after is not None:
+            start = bisect_right(snap.keys, (after[0], -after[1]))
+            mask &= ~((1 << start) - 1)
+            offset = 0
+
+        page: list[CourseOut] = []
+        last_pos = -1
+        while mask and len(page) < limit:
+            low = mask & -mask
+            mask ^= low
+            if offset:
+                offset -= 1
+                continue
+            last_pos = low.bit_length() - 1
+            page.append(snap.courses[last_pos])
+
+        next_key = None
+        if mask and last_pos >= 0:
+            sort_order, neg_id = snap.keys[last_pos]
+            next_key = (sort_order, -neg_id)
+        return page, total, next_key
+
+    @staticmethod
+    def _entry(course: Course) -> tuple[tuple[int, int], CourseOut]:
+        return (course.sort_order or 0, -course.id), CourseOut.model_validate(course)
+
+    def _rebuild(self) -> None:
+        # Caller holds the lock; readers keep using the old snapshot until the swap.
+        ordered = sorted(self._entries.values(), key=lambda entry: entry[0])
+        self._snapshot = CatalogSnapshot([c for _, c in ordered], [k for k, _ in ordered])
+
+
+course_catalog = CourseCatalog()
+
+# Catalog totals keyed by filter tuple; cleared on admin course writes
+course_counts: TTLCache[int] = TTLCache(settings.course_count_cache_max_entries, settings.course_count_cache_ttl_seconds)
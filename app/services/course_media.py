@@ -0,0 +1,135 @@
+import logging
+import threading
+from itertools import chain
+from typing import Iterable, Optional
+
+from sqlalchemy import ARRAY, Integer, cast, event, func, inspect, literal, select, update
+from sqlalchemy.orm import Session
+
+from app.db.session import AsyncSessionLocal
+from app.models.course import Course, CourseVideo
+from app.services.catalog import course_catalog
+from app.services.response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CourseMedia:
+    __slots__ = ("total_duration_seconds", "video_ids")
+
+    def __init__(self, total_duration_seconds: int, video_ids: Iterable[int]):
+        self.total_duration_seconds = total_duration_seconds or 0
+        self.video_ids = frozenset(video_ids or ())
+
+
+class CourseMediaIndex:
+    """Per-course total video duration and video-ID set, mirrored from ``courses``.
+
+    The columns (``total_duration_seconds``, ``video_ids`` and the derived
+    ``estimated_duration_minutes``) are recomputed in the same transaction
+    as any ORM change to ``CourseVideo`` rows, and this map is updated when
+    that transaction commits. Other workers pick changes up on the periodic
+    ``reload``; a miss falls back to reading the course row.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._media: dict[int, CourseMedia] = {}
+
+    def get(self, course_id: int) -> Optional[CourseMedia]:
+        return self._media.get(course_id)
+
+    def set(self, course_id: int, total_duration_seconds: int, video_ids: Iterable[int]) -> CourseMedia:
+        media = CourseMedia(total_duration_seconds, video_ids)
+        with self._lock:
+            self._media[course_id] = media
+        return media
+
+    def remove(self, course_id: int) -> None:
+        with self._lock:
+            self._media.pop(course_id, None)
+
+    async def reload(self) -> None:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Course.id, Course.total_duration_seconds, Course.video_ids))).all()
+        media = {row.id: CourseMedia(row.total_duration_seconds, row.video_ids) for row in rows}
+        with self._lock:
+            self._media = media
+
+
+course_media = CourseMediaIndex()
+
+
+def recompute_course_media_stmt(course_ids: Optional[Iterable[int]] = None):
+    """UPDATE courses with their video totals; all courses when ``course_ids`` is None."""
+    total = (
+        select(func.coalesce(func.sum(CourseVideo.duration_seconds), 0))
+        .where(CourseVideo.course_id == Course.id)
+        .scalar_subquery()
+    )
+    video_ids = func.coalesce(
+        select(func.array_agg(CourseVideo.id)).where(CourseVideo.course_id == Course.id).scalar_subquery(),
+        cast(literal([], ARRAY(Integer)), ARRAY(Integer)),
+    )
+    stmt = update(Course).values(
+        total_duration_seconds=total,
+        estimated_duration_minutes=(total + 59) // 60,
+        video_ids=video_ids,
+    )
+    if course_ids is not None:
+        stmt = stmt.where(Course.id.in_(list(course_ids)))
+    return stmt.returning(
+        Course.id, Course.total_duration_seconds, Course.estimated_duration_minutes, Course.video_ids
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _recompute_after_video_changes(session: Session, flush_context) -> None:
+    course_ids: set[int] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, CourseVideo):
+            continue
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        course_ids.add(obj.course_id)
+        # A video moved to another course changes both
+        course_ids.update(v for v in inspect(obj).attrs.course_id.history.deleted if v is not None)
+    course_ids.discard(None)
+    if not course_ids:
+        return
+    rows = session.connection().execute(
+        recompute_course_media_stmt(course_ids), execution_options={"synchronize_session": False}
+    ).all()
+    pending = session.info.setdefault("course_media", {})
+    pending.update({row.id: row for row in rows})
+
+
+def _publish(rows: Iterable) -> None:
+    """Mirror recomputed rows into the media index and the catalog (before caches refill from it)."""
+    durations = {}
+    for row in rows:
+        course_media.set(row.id, row.total_duration_seconds, row.video_ids)
+        durations[row.id] = (row.total_duration_seconds, row.estimated_duration_minutes)
+    course_catalog.update_durations(durations)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_course_media(session: Session) -> None:
+    pending = session.info.pop("course_media", None)
+    if not pending:
+        return
+    _publish(pending.values())
+    response_cache.invalidate_tags("courses", *(f"course:{course_id}" for course_id in pending))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_course_media(session: Session) -> None:
+    session.info.pop("course_media", None)
+
+
+def rebuild_course_media(db: Session) -> int:
+    """Recompute the denormalized columns for every course (backfill / repair)."""
+    rows = db.execute(recompute_course_media_stmt(), execution_options={"synchronize_session": False}).all()
+    db.commit()
+    _publish(rows)
+    return len(rows)
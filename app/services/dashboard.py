@@ -0,0 +1,173 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.course import Course
+from app.models.dashboard import DashboardMetric
+from app.models.subscription_plan import UserSubscription
+from app.models.user import User
+from app.services.revenue import revenue_total_stmt
+
+logger = logging.getLogger(__name__)
+
+# pg advisory lock key: one worker recomputes at a time, the others read its result
+REFRESH_LOCK_KEY = 0x64617368
+
+MetricFn = Callable[[AsyncSession, dict], Awaitable[Any]]
+
+
+class DashboardSnapshot:
+    __slots__ = ("values", "as_of")
+
+    def __init__(self, values: dict, as_of: datetime):
+        self.values = values
+        self.as_of = as_of
+
+
+class DashboardMetrics:
+    """Registry of admin dashboard metrics and the latest snapshot of their values.
+
+    A metric is an async ``(db, computed) -> JSON value`` callable registered
+    with ``metric``. Metrics run in registration order, and ``computed`` holds
+    the values produced so far in the same pass, so derived metrics need no
+    query of their own. ``refresh`` stores the results in dashboard_metrics
+    (one row per metric) and keeps a copy in memory; requests only read that
+    copy.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, MetricFn] = {}
+        self._snapshot: Optional[DashboardSnapshot] = None
+        self._lock = asyncio.Lock()
+
+    def metric(self, name: str) -> Callable[[MetricFn], MetricFn]:
+        def register(fn: MetricFn) -> MetricFn:
+            self._metrics[name] = fn
+            return fn
+
+        return register
+
+    @property
+    def snapshot(self) -> Optional[DashboardSnapshot]:
+        return self._snapshot
+
+    async def refresh(self, force: bool = False) -> DashboardSnapshot:
+        """Bring the in-memory snapshot up to date, recomputing only when needed.
+
+        Without ``force`` a stored snapshot younger than
+        ``dashboard_refresh_seconds`` is reused, and if another worker holds
+        the refresh lock its previous values are served meanwhile. ``force``
+        waits for the lock and always recomputes.
+        """
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                if not force:
+                    stored = await self._load(db)
+                    stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.dashboard_refresh_seconds)
+                    if stored is not None and stored.as_of >= stale_before:
+                        return self._publish(stored)
+                    if not await db.scalar(select(func.pg_try_advisory_xact_lock(REFRESH_LOCK_KEY))):
+                        if stored is not None:
+                            return self._publish(stored)
+                        # Nothing to serve yet: wait for the other worker, then use its result
+                        await db.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_KEY)))
+                        stored = await self._load(db)
+                        if stored is not None:
+                            return self._publish(stored)
+                else:
+                    await db.execute(select(func.pg_advisory_xact_lock(REFRESH_LOCK_KEY)))
+                snapshot = await self._compute(db)
+                await db.commit()
+            logger.info("dashboard metrics refreshed (%d metrics)", len(snapshot.values))
+            return self._publish(snapshot)
+
+    async def _load(self, db: AsyncSession) -> Optional[DashboardSnapshot]:
+        """The stored snapshot, or None while any registered metric has never been computed."""
+        rows = (
+            await db.execute(
+                select(DashboardMetric.name, DashboardMetric.value, DashboardMetric.computed_at).where(
+                    DashboardMetric.name.in_(self._metrics)
+                )
+            )
+        ).all()
+        if len(rows) < len(self._metrics):
+            return None
+        values = {row.name: row.value for row in rows}
+        return DashboardSnapshot({name: values[name] for name in self._metrics}, min(row.computed_at for row in rows))
+
+    async def _compute(self, db: AsyncSession) -> DashboardSnapshot:
+        computed: dict[str, Any] = {}
+        for name, fn in self._metrics.items():
+            computed[name] = await fn(db, computed)
+        as_of = datetime.now(timezone.utc)
+        stmt = insert(DashboardMetric).values(
+            [{"name": name, "value": value, "computed_at": as_of} for name, value in computed.items()]
+        )
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[DashboardMetric.name],
+                set_={"value": stmt.excluded.value, "computed_at": stmt.excluded.computed_at},
+            )
+        )
+        return DashboardSnapshot(computed, as_of)
+
+    def _publish(self, snapshot: DashboardSnapshot) -> DashboardSnapshot:
+        self._snapshot = snapshot
+        return snapshot
+
+
+dashboard_metrics = DashboardMetrics()
+
+
+def _month_start(now: datetime, months_back: int = 0) -> datetime:
+    month_index = now.year * 12 + now.month - 1 - months_back
+    return now.replace(
+        year=month_index // 12, month=month_index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0
+    )
+
+
+async def _rollup_revenue(db: AsyncSession, start: datetime, end: datetime) -> float:
+    """All revenue (subscriptions at their billed price plus purchases) over [start, end), cents included."""
+    return float(await db.scalar(revenue_total_stmt(start.date(), end.date())) or 0)
+
+
+@dashboard_metrics.metric("total_users")
+async def total_users(db: AsyncSession, computed: dict) -> int:
+    return await db.scalar(select(func.count(User.id))) or 0
+
+
+@dashboard_metrics.metric("total_courses")
+async def total_courses(db: AsyncSession, computed: dict) -> int:
+    return await db.scalar(select(func.count(Course.id))) or 0
+
+
+@dashboard_metrics.metric("active_subscriptions")
+async def active_subscriptions(db: AsyncSession, computed: dict) -> int:
+    return await db.scalar(select(func.count(UserSubscription.id)).where(UserSubscription.status == "active")) or 0
+
+
+@dashboard_metrics.metric("total_revenue")
+async def current_month_revenue(db: AsyncSession, computed: dict) -> float:
+    start = _month_start(datetime.now(timezone.utc))
+    return await _rollup_revenue(db, start, _month_start(start, -1))
+
+
+@dashboard_metrics.metric("last_month_revenue")
+async def last_month_revenue(db: AsyncSession, computed: dict) -> float:
+    now = datetime.now(timezone.utc)
+    return await _rollup_revenue(db, _month_start(now, 1), _month_start(now))
+
+
+@dashboard_metrics.metric("monthly_growth")
+async def monthly_growth(db: AsyncSession, computed: dict) -> float:
+    last = computed["last_month_revenue"]
+    if last <= 0:
+        return 0.0
+    return (computed["total_revenue"] - last) / last * 100.0
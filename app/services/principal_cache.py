@@ -0,0 +1,29 @@
+from typing import Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.models.user import User
+from app.schemas.user import UserOut
+
+
+class PrincipalCache:
+    """Authenticated users by id, holding only the fields routes read (UserOut).
+
+    Entries are dropped whenever a route changes the user; the TTL bounds
+    staleness for changes made through another worker.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._cache: TTLCache[UserOut] = TTLCache(max_entries, ttl_seconds)
+
+    def get(self, user_id: int) -> Optional[UserOut]:
+        return self._cache.get(user_id)
+
+    def put(self, user: User) -> UserOut:
+        return self._cache.set(user.id, UserOut.model_validate(user))
+
+    def invalidate(self, user_id: int) -> None:
+        self._cache.pop(user_id)
+
+
+principal_cache = PrincipalCache(settings.principal_cache_max_entries, settings.principal_cache_ttl_seconds)
@@ -0,0 +1,246 @@
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import and_, func, literal_column, or_, select, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.course import UserCourseProgress
+from app.services.user_stats import apply_stats_deltas, course_progress_deltas
+
+logger = logging.getLogger(__name__)
+
+# RETURNING column that is true for rows the upsert inserted (no prior row version)
+INSERTED = literal_column("xmax = 0").label("inserted")
+
+
+def upsert_course_progress_stmt(rows: list[dict]):
+    """Multi-row INSERT ... ON CONFLICT (user_id, course_id) DO UPDATE for progress rows.
+
+    ``started_at`` is kept from the existing row, a completion, once
+    recorded, is never cleared, and a row without a ``current_video_id``
+    keeps the stored resume video.
+    """
+    stmt = insert(UserCourseProgress).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserCourseProgress.user_id, UserCourseProgress.course_id],
+        set_={
+            "current_video_id": func.coalesce(stmt.excluded.current_video_id, UserCourseProgress.current_video_id),
+            "progress_percentage": stmt.excluded.progress_percentage,
+            "last_accessed_at": stmt.excluded.last_accessed_at,
+            "completed_at": func.coalesce(stmt.excluded.completed_at, UserCourseProgress.completed_at),
+            "updated_at": func.now(),
+        },
+    )
+
+
+def upsert_course_progress_tracked(rows: list[dict]):
+    """``upsert_course_progress_stmt`` as one statement that also reports what each row changed.
+
+    ``started`` marks a row this statement inserted, read from the upsert
+    itself (``xmax = 0``), so concurrent first writes count once. ``completed``
+    marks a first completion: an inserted row that is completed, or an
+    updated one whose ``completed_at`` was NULL in the statement snapshot
+    (the ``prior`` CTE). Two concurrent writes completing the same course
+    can both see NULL there; ``rebuild-user-stats`` corrects that drift.
+    """
+    keys = [(row["user_id"], row["course_id"]) for row in rows]
+    prior = (
+        select(UserCourseProgress.user_id, UserCourseProgress.course_id, UserCourseProgress.completed_at)
+        .where(tuple_(UserCourseProgress.user_id, UserCourseProgress.course_id).in_(keys))
+        .cte("prior")
+    )
+    upserted = (
+        upsert_course_progress_stmt(rows)
+        .returning(
+            UserCourseProgress.user_id,
+            UserCourseProgress.course_id,
+            UserCourseProgress.progress_percentage,
+            UserCourseProgress.current_video_id,
+            UserCourseProgress.started_at,
+            UserCourseProgress.last_accessed_at,
+            UserCourseProgress.completed_at,
+            INSERTED,
+        )
+        .cte("upserted")
+    )
+    first_completion = and_(
+        upserted.c.completed_at.is_not(None),
+        or_(upserted.c.inserted, and_(prior.c.user_id.is_not(None), prior.c.completed_at.is_(None))),
+    )
+    return select(
+        *(c for c in upserted.c if c.name != "inserted"),
+        upserted.c.inserted.label("started"),
+        first_completion.label("completed"),
+    ).outerjoin(
+        prior, and_(prior.c.user_id == upserted.c.user_id, prior.c.course_id == upserted.c.course_id)
+    )
+
+
+class BufferedProgress:
+    __slots__ = (
+        "user_id",
+        "course_id",
+        "current_video_id",
+        "progress_percentage",
+        "started_at",
+        "last_accessed_at",
+        "completed_at",
+    )
+
+    def __init__(
+        self,
+        user_id: int,
+        course_id: int,
+        current_video_id: Optional[int],
+        progress_percentage: int,
+        started_at: datetime,
+        last_accessed_at: datetime,
+        completed_at: Optional[datetime],
+    ):
+        self.user_id = user_id
+        self.course_id = course_id
+        self.current_video_id = current_video_id
+        self.progress_percentage = progress_percentage
+        self.started_at = started_at
+        self.last_accessed_at = last_accessed_at
+        self.completed_at = completed_at
+
+    def row(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def merged_with(self, stored: Optional[dict]) -> dict:
+        """This buffered state laid over the stored row (a dict of the same fields), if any."""
+        merged = self.row()
+        if stored:
+            if stored.get("started_at"):
+                merged["started_at"] = min(stored["started_at"], self.started_at)
+            if merged["completed_at"] is None:
+                merged["completed_at"] = stored.get("completed_at")
+            if merged["current_video_id"] is None:
+                merged["current_video_id"] = stored.get("current_video_id")
+        return merged
+
+
+class ProgressBuffer:
+    """Write-behind buffer for course progress heartbeats (``progress_write_behind``).
+
+    Only the latest state per (user_id, course_id) is kept; ``flush`` writes
+    everything pending as multi-row INSERT ... ON CONFLICT DO UPDATE
+    statements in one transaction. Entries stay readable (``get`` /
+    ``for_user``) until their flush has committed, so a client always reads
+    its own writes. Up to ``progress_flush_interval_seconds`` of heartbeats
+    can be lost if the process dies without a clean shutdown.
+
+    A batch the database rejects (a constraint violation, an out-of-range
+    value, ...) is split until the offending rows are isolated; those are
+    logged and dropped so they cannot block later flushes. Lost connections
+    re-queue the whole batch instead. At most ``progress_buffer_max_entries`` keys are buffered
+    (``accepts``); callers write other keys directly meanwhile.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict[tuple[int, int], BufferedProgress] = {}
+        self._flushing: dict[tuple[int, int], BufferedProgress] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return settings.progress_write_behind
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def accepts(self, user_id: int, course_id: int) -> bool:
+        """Whether a write for this key may be buffered: always once buffered, else while below the cap."""
+        if not self.enabled:
+            return False
+        key = (user_id, course_id)
+        with self._lock:
+            return (
+                key in self._pending
+                or key in self._flushing
+                or len(self._pending) < settings.progress_buffer_max_entries
+            )
+
+    def get(self, user_id: int, course_id: int) -> Optional[BufferedProgress]:
+        key = (user_id, course_id)
+        with self._lock:
+            return self._pending.get(key) or self._flushing.get(key)
+
+    def for_user(self, user_id: int) -> list[BufferedProgress]:
+        with self._lock:
+            merged = {k[1]: v for k, v in self._flushing.items() if k[0] == user_id}
+            merged.update({k[1]: v for k, v in self._pending.items() if k[0] == user_id})
+        return list(merged.values())
+
+    def put(self, entry: BufferedProgress) -> BufferedProgress:
+        """Record the latest state, keeping the earliest start, any completion and the last resume video seen."""
+        key = (entry.user_id, entry.course_id)
+        with self._lock:
+            previous = self._pending.get(key) or self._flushing.get(key)
+            if previous is not None:
+                entry.started_at = min(previous.started_at, entry.started_at)
+                if entry.completed_at is None:
+                    entry.completed_at = previous.completed_at
+                if entry.current_video_id is None:
+                    entry.current_video_id = previous.current_video_id
+            self._pending[key] = entry
+        return entry
+
+    async def flush(self) -> int:
+        if not self._flush_lock.acquire(blocking=False):
+            return 0  # a flush is already running
+        try:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._flushing, self._pending = self._pending, {}
+            rows = [entry.row() for entry in self._flushing.values()]
+            try:
+                async with AsyncSessionLocal() as db:
+                    batch_size = settings.progress_flush_batch_size
+                    changes = []
+                    for start in range(0, len(rows), batch_size):
+                        changes.extend(await self._write(db, rows[start:start + batch_size]))
+                    await apply_stats_deltas(db, course_progress_deltas(changes))
+                    await db.commit()
+            except BaseException:
+                # Put the batch back unless a newer heartbeat replaced it meanwhile
+                with self._lock:
+                    for key, entry in self._flushing.items():
+                        self._pending.setdefault(key, entry)
+                    self._flushing = {}
+                raise
+            with self._lock:
+                self._flushing = {}
+            logger.debug("flushed %d buffered progress rows", len(rows))
+            return len(rows)
+        finally:
+            self._flush_lock.release()
+
+    async def _write(self, db: AsyncSession, rows: list[dict]) -> list:
+        """Upsert rows under a savepoint, bisecting on database errors and dropping the rows that fail alone."""
+        try:
+            async with db.begin_nested():
+                return (await db.execute(upsert_course_progress_tracked(rows))).all()
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                raise
+            if len(rows) == 1:
+                row = rows[0]
+                logger.warning(
+                    "dropping buffered progress user_id=%s course_id=%s: %s", row["user_id"], row["course_id"], e.orig
+                )
+                return []
+            middle = len(rows) // 2
+            return await self._write(db, rows[:middle]) + await self._write(db, rows[middle:])
+
+
+progress_buffer = ProgressBuffer()
@@ -0,0 +1,69 @@
+import hashlib
+from typing import Any, Iterable, Optional
+
+from fastapi import Request, Response
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+
+class CachedResponse:
+    __slots__ = ("body", "etag", "media_type", "tags")
+
+    def __init__(self, body: bytes, media_type: str, tags: frozenset[str]) -> None:
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.media_type = media_type
+        self.tags = tags
+
+    def to_response(self, request: Request) -> Response:
+        """Full response, or 304 when the client already holds this ETag."""
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=self.body, media_type=self.media_type, headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def make_key(route: str, **params: Any) -> str:
+    """Cache key from the route name and its parsed (normalized) parameters."""
+    parts = [f"{name}={getattr(value, 'value', value)}" for name, value in sorted(params.items()) if value is not None]
+    return route + "?" + "&".join(parts)
+
+
+class ResponseCache:
+    """Bounded LRU of serialized responses with TTL and tag-based invalidation."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self._cache: TTLCache[CachedResponse] = TTLCache(max_entries, ttl_seconds)
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._cache.get(key)
+
+    def set(
+        self, key: str, body: bytes, tags: Iterable[str] = (), media_type: str = "application/json"
+    ) -> CachedResponse:
+        return self._cache.set(key, CachedResponse(body, media_type, frozenset(tags)))
+
+    def invalidate_tags(self, *tags: str) -> None:
+        targets = set(tags)
+        self._cache.discard_where(lambda entry: not entry.tags.isdisjoint(targets))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+response_cache = ResponseCache(settings.response_cache_max_entries, settings.response_cache_ttl_seconds)
+
+
+def cache_and_respond(request: Request, key: str, body: bytes, tags: Iterable[str]) -> Response:
+    return response_cache.set(key, body, tags).to_response(request)
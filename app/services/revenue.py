@@ -0,0 +1,228 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional
+
+from sqlalchemy import (
+    Date,
+    DateTime,
+    Numeric,
+    case,
+    cast,
+    column,
+    delete,
+    event,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    select,
+    table,
+    union_all,
+)
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.purchase import CoursePurchase
+from app.models.revenue import RevenueDaily
+from app.models.subscription_plan import SubscriptionPlan, UserSubscription
+
+SUBSCRIPTION = "subscription"
+COURSE_PURCHASE = "course_purchase"
+PURCHASE = "purchase"
+
+PAID_PURCHASE_STATUSES = ("completed", "paid")
+# A subscription whose first period is longer than a month is billed at the yearly price
+YEARLY_PERIOD = timedelta(days=31)
+
+# Legacy one-off purchases; app.models.subscription cannot be mapped next to the
+# current models, so the table is read through Core (backfill only)
+purchases = table(
+    "purchases",
+    column("amount", Numeric(10, 2)),
+    column("created_at", DateTime(timezone=True)),
+)
+
+
+def _utc_day(at: Optional[datetime]) -> date:
+    return (at or datetime.now(timezone.utc)).astimezone(timezone.utc).date()
+
+
+def _day(col):
+    return cast(func.timezone("UTC", col), Date)
+
+
+def add_revenue_stmt(rows: list[dict]):
+    """INSERT ... ON CONFLICT (day, source) DO UPDATE adding each row's amount and count."""
+    stmt = insert(RevenueDaily).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[RevenueDaily.day, RevenueDaily.source],
+        set_={
+            "amount": RevenueDaily.amount + stmt.excluded.amount,
+            "transactions": RevenueDaily.transactions + stmt.excluded.transactions,
+            "updated_at": func.now(),
+        },
+    )
+
+
+def _subscription_price(values: dict):
+    started_at, expires_at = values.get("started_at"), values.get("expires_at")
+    yearly = started_at is not None and expires_at is not None and expires_at - started_at > YEARLY_PERIOD
+    price = SubscriptionPlan.price_yearly if yearly else SubscriptionPlan.price_monthly
+    return select(price).where(SubscriptionPlan.id == values.get("plan_id")).scalar_subquery()
+
+
+def _paid_amount(values: dict) -> Any:
+    return (values.get("amount") or 0) if values.get("status") in PAID_PURCHASE_STATUSES else 0
+
+
+@event.listens_for(Session, "after_flush")
+def _record_billing_events(session: Session, flush_context) -> None:
+    """Fold new/removed subscriptions and paid course purchases into revenue_daily.
+
+    Runs inside the flushing transaction, so the rollup commits or rolls back
+    with the write. Attribute values are read from instance state to avoid
+    lazy loads; an in-place plan change is not a charge and is ignored.
+    """
+    deltas: dict[tuple[date, str], list] = {}
+
+    def add(day: date, source: str, amount: Any, transactions: int) -> None:
+        entry = deltas.setdefault((day, source), [0, 0])
+        entry[0] = entry[0] + amount
+        entry[1] += transactions
+
+    for obj in session.new:
+        values = inspect(obj).dict
+        if isinstance(obj, UserSubscription):
+            add(_utc_day(values.get("started_at")), SUBSCRIPTION, _subscription_price(values), 1)
+        elif isinstance(obj, CoursePurchase) and values.get("status") in PAID_PURCHASE_STATUSES:
+            add(_utc_day(values.get("purchased_at")), COURSE_PURCHASE, values.get("amount") or 0, 1)
+    for obj in session.deleted:
+        values = inspect(obj).dict
+        if isinstance(obj, UserSubscription):
+            add(_utc_day(values.get("started_at")), SUBSCRIPTION, -_subscription_price(values), -1)
+        elif isinstance(obj, CoursePurchase) and values.get("status") in PAID_PURCHASE_STATUSES:
+            add(_utc_day(values.get("purchased_at")), COURSE_PURCHASE, -(values.get("amount") or 0), -1)
+    for obj in session.dirty:
+        if not isinstance(obj, CoursePurchase) or not session.is_modified(obj):
+            continue
+        attrs = inspect(obj).attrs
+        current = inspect(obj).dict
+        previous = dict(current)
+        for name in ("status", "amount"):
+            if attrs[name].history.deleted:
+                previous[name] = attrs[name].history.deleted[0]
+        was_paid = previous.get("status") in PAID_PURCHASE_STATUSES
+        is_paid = current.get("status") in PAID_PURCHASE_STATUSES
+        if (was_paid, _paid_amount(previous)) == (is_paid, _paid_amount(current)):
+            continue
+        day = _utc_day(current.get("purchased_at"))
+        add(day, COURSE_PURCHASE, _paid_amount(current) - _paid_amount(previous), int(is_paid) - int(was_paid))
+
+    if deltas:
+        rows = [
+            {"day": day, "source": source, "amount": amount, "transactions": transactions}
+            for (day, source), (amount, transactions) in deltas.items()
+        ]
+        session.connection().execute(add_revenue_stmt(rows))
+
+
+def rebuild_revenue_stmt(include_purchases: bool):
+    yearly = UserSubscription.expires_at > UserSubscription.started_at + YEARLY_PERIOD
+    amount = Numeric(14, 2)
+    sources = [
+        select(
+            _day(UserSubscription.started_at).label("day"),
+            literal(SUBSCRIPTION).label("source"),
+            cast(
+                case((yearly, SubscriptionPlan.price_yearly), else_=SubscriptionPlan.price_monthly), amount
+            ).label("amount"),
+        ).join(SubscriptionPlan, SubscriptionPlan.id == UserSubscription.plan_id),
+        select(
+            _day(CoursePurchase.purchased_at),
+            literal(COURSE_PURCHASE),
+            cast(CoursePurchase.amount, amount),
+        ).where(CoursePurchase.status.in_(PAID_PURCHASE_STATUSES)),
+    ]
+    if include_purchases:
+        sources.append(select(_day(purchases.c.created_at), literal(PURCHASE), cast(purchases.c.amount, amount)))
+    events = union_all(*sources).subquery("events")
+    return insert(RevenueDaily).from_select(
+        ["day", "source", "amount", "transactions"],
+        select(events.c.day, events.c.source, func.sum(events.c.amount), func.count())
+        .group_by(events.c.day, events.c.source),
+    )
+
+
+def rebuild_revenue(db: Session) -> int:
+    """Recompute revenue_daily from every subscription and purchase (backfill / repair)."""
+    include_purchases = inspect(db.connection()).has_table("purchases")
+    db.execute(delete(RevenueDaily))
+    count = db.execute(rebuild_revenue_stmt(include_purchases)).rowcount
+    db.commit()
+    return count
+
+
+def revenue_total_stmt(start: date, end: date):
+    """Revenue over [start, end) from the rollup."""
+    return select(func.coalesce(func.sum(RevenueDaily.amount), 0)).where(
+        RevenueDaily.day >= start, RevenueDaily.day < end
+    )
+
+
+def bucket_floor(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def bucket_count(start: date, end: date, bucket: str) -> int:
+    """Number of buckets ``revenue_series`` returns for the inclusive day range."""
+    if bucket == "week":
+        return (end - bucket_floor(start, bucket)).days // 7 + 1
+    if bucket == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def revenue_series(db: Session, start: date, end: date, bucket: str) -> list[dict]:
+    """Per-bucket totals for the inclusive day range, empty buckets included.
+
+    Reads only rollup rows in the range and groups them in SQL, so the cost
+    follows the number of days/buckets rather than the number of payments.
+    """
+    if bucket == "day":
+        bucket_start = RevenueDaily.day
+    else:
+        # Literal unit (validated by the caller) so SELECT and GROUP BY render identically
+        bucket_start = cast(func.date_trunc(literal_column(f"'{bucket}'"), RevenueDaily.day), Date)
+    rows = db.execute(
+        select(
+            bucket_start.label("start"),
+            RevenueDaily.source,
+            func.sum(RevenueDaily.amount).label("amount"),
+            func.sum(RevenueDaily.transactions).label("transactions"),
+        )
+        .where(RevenueDaily.day >= start, RevenueDaily.day <= end)
+        .group_by(bucket_start, RevenueDaily.source)
+    ).all()
+
+    buckets: dict[date, dict] = {}
+    cursor = bucket_floor(start, bucket)
+    while cursor <= end:
+        buckets[cursor] = {"start": cursor, "amount": 0.0, "transactions": 0, "by_source": {}}
+        cursor = next_bucket(cursor, bucket)
+    for row in rows:
+        entry = buckets[row.start]
+        entry["amount"] += float(row.amount)
+        entry["transactions"] += int(row.transactions)
+        entry["by_source"][row.source] = float(row.amount)
+    return list(buckets.values())
@@ -0,0 +1,127 @@
+import heapq
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.token import PasswordResetToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+class TokenDenylist:
+    """In-memory set of revoked jtis, each kept only until its token expires.
+
+    Lookups are a dict probe with no I/O. The set stays bounded by the number
+    of unexpired revoked tokens because a min-heap on expiry drops entries as
+    soon as the token could no longer be accepted anyway. Workers converge by
+    polling the revoked_tokens table (see ``sync``).
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._revoked: dict[str, float] = {}
+        self._expiry_heap: list[tuple[float, str]] = []
+        self._watermark: Optional[datetime] = None
+
+    def is_revoked(self, jti: str) -> bool:
+        exp = self._revoked.get(jti)
+        if exp is None:
+            return False
+        if exp <= time.time():
+            self._prune()
+            return False
+        return True
+
+    def add(self, jti: str, expires_at: datetime) -> None:
+        self.add_many([(jti, expires_at)])
+
+    def add_many(self, entries: Iterable[tuple[str, datetime]]) -> None:
+        now = time.time()
+        with self._lock:
+            for jti, expires_at in entries:
+                exp = expires_at.timestamp()
+                if exp <= now or jti in self._revoked:
+                    continue
+                self._revoked[jti] = exp
+                heapq.heappush(self._expiry_heap, (exp, jti))
+            self._prune_locked(now)
+
+    def _prune(self) -> None:
+        with self._lock:
+            self._prune_locked(time.time())
+
+    def _prune_locked(self, now: float) -> None:
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, jti = heapq.heappop(heap)
+            self._revoked.pop(jti, None)
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    async def sync(self) -> None:
+        """Pull revocations made by any worker since the last sync.
+
+        The watermark is moved back by an overlap window so rows whose
+        transaction committed after a later-stamped row are not missed;
+        re-reading a row is harmless.
+        """
+        overlap = timedelta(seconds=max(settings.token_revocation_sync_seconds, 1) * 2)
+        async with AsyncSessionLocal() as db:
+            stmt = select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at).where(
+                RevokedToken.expires_at > func.now()
+            )
+            if self._watermark is not None:
+                stmt = stmt.where(RevokedToken.revoked_at > self._watermark - overlap)
+            rows = (await db.execute(stmt)).all()
+        if rows:
+            self.add_many((jti, expires_at) for jti, expires_at, _ in rows)
+            latest = max(revoked_at for _, _, revoked_at in rows)
+            if self._watermark is None or latest > self._watermark:
+                self._watermark = latest
+        elif self._watermark is None:
+            self._watermark = datetime.now(timezone.utc) - overlap
+
+
+token_denylist = TokenDenylist()
+
+
+async def revoke_token(db: AsyncSession, jti: str, user_id: Optional[int], expires_at: datetime) -> None:
+    await db.execute(
+        insert(RevokedToken)
+        .values(jti=jti, user_id=user_id, expires_at=expires_at)
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+    )
+    await db.commit()
+    token_denylist.add(jti, expires_at)
+
+
+def revoke_user_tokens(db: Session, user_id: int) -> list[tuple[str, datetime]]:
+    """Revoke every unexpired token issued to the user (admin deactivation/deletion).
+
+    Runs in the caller's transaction; pass the returned (jti, expires_at)
+    pairs to ``token_denylist.add_many`` once the commit succeeds.
+    """
+    rows = db.execute(
+        insert(RevokedToken)
+        .from_select(
+            ["jti", "user_id", "expires_at"],
+            select(PasswordResetToken.jti, PasswordResetToken.user_id, PasswordResetToken.expires_at).where(
+                PasswordResetToken.user_id == user_id,
+                PasswordResetToken.jti.is_not(None),
+                PasswordResetToken.expires_at > func.now(),
+            ),
+        )
+        .on_conflict_do_nothing(index_elements=[RevokedToken.jti])
+        .returning(RevokedToken.jti, RevokedToken.expires_at)
+    ).all()
+    return [(jti, expires_at) for jti, expires_at in rows]
@@ -1,34 +1,688 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
 import uuid
-from typing import Optional
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import datetime, timezone
+from typing import Any, Optional, TypeVar
 
 import boto3
 from botocore.client import Config as BotoConfig
+from botocore.exceptions import ClientError
+from fastapi import UploadFile
 
 from app.core.config import settings
+from app.core.keyring import key_ring
+
+T = TypeVar("T")
+
+
+class EmptyUpload(ValueError):
+    pass
+
+
+class UploadVerificationError(ValueError):
+    pass
+
+
+class ObjectStat:
+    __slots__ = ("size", "checksum_sha256")
+
+    def __init__(self, size: int, checksum_sha256: Optional[str]):
+        self.size = size
+        # Base64 SHA-256 of the object; None when the backend did not record one
+        self.checksum_sha256 = checksum_sha256
+
+
+class S3Backend:
+    # S3 only keeps a checksum-of-part-checksums for multipart objects
+    verifies_multipart_sha256 = False
+    # Presigned parts must carry x-amz-checksum-sha256, which S3 checks against the body
+    part_checksum_algorithm: Optional[str] = "SHA256"
+
+    def __init__(self, bucket: str) -> None:
+        self.bucket = bucket
+        # Caps in-flight calls to this backend across all requests
+        self.slots = asyncio.Semaphore(settings.storage_max_concurrency)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """One lazily built client (and so one HTTP connection pool) shared by every thread."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    # Client creation on the default session is not thread-safe; use our own
+                    self._client = boto3.session.Session().client(
+                        "s3",
+                        aws_access_key_id=settings.aws_access_key_id,
+                        aws_secret_access_key=settings.aws_secret_access_key,
+                        config=BotoConfig(
+                            s3={"addressing_style": "virtual"},
+                            max_pool_connections=settings.storage_io_workers,
+                        ),
+                    )
+        return self._client
+
+    def url_for(self, key: str) -> str:
+        return f"https://{self.bucket}.s3.amazonaws.com/{key}"
+
+    def put_object(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        extra = {"ContentType": content_type} if content_type else {}
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **extra)
+
+    def create_multipart_upload(self, key: str, content_type: Optional[str] = None, part_checksums: bool = False) -> str:
+        extra: dict[str, Any] = {"ContentType": content_type} if content_type else {}
+        if part_checksums:
+            extra["ChecksumAlgorithm"] = self.part_checksum_algorithm
+        return self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)["UploadId"]
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=data
+        )
+        return response["ETag"]
+
+    def _iter_parts(self, key: str, upload_id: str) -> Iterator[dict[str, Any]]:
+        paginator = self.client.get_paginator("list_parts")
+        for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+            yield from page.get("Parts", [])
+
+    def list_parts(self, key: str, upload_id: str) -> dict[int, str]:
+        return {part["PartNumber"]: part["ETag"] for part in self._iter_parts(key, upload_id)}
+
+    def list_part_checksums(self, key: str, upload_id: str) -> Optional[dict[int, Optional[str]]]:
+        """SHA-256 S3 verified for each stored part (None for a part sent without one)."""
+        return {part["PartNumber"]: part.get("ChecksumSHA256") for part in self._iter_parts(key, upload_id)}
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: dict[int, str], checksums: Optional[dict[int, str]] = None
+    ) -> None:
+        completed = []
+        for n in sorted(parts):
+            part = {"PartNumber": n, "ETag": parts[n]}
+            if checksums:
+                part["ChecksumSHA256"] = checksums[n]
+            completed.append(part)
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": completed}
+        )
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+
+    def presign_put(
+        self, key: str, size: int, content_type: Optional[str], checksum_sha256: Optional[str], expires_in: int
+    ) -> tuple[str, dict[str, str]]:
+        """Return the URL and the headers the client must send with its PUT.
+
+        A declared checksum is signed into the URL, so S3 rejects a body that
+        does not match it.
+        """
+        params: dict[str, Any] = {"Bucket": self.bucket, "Key": key}
+        headers: dict[str, str] = {}
+        if content_type:
+            params["ContentType"] = content_type
+            headers["Content-Type"] = content_type
+        if checksum_sha256:
+            params["ChecksumSHA256"] = checksum_sha256
+            headers["x-amz-checksum-sha256"] = checksum_sha256
+        url = self.client.generate_presigned_url("put_object", Params=params, ExpiresIn=expires_in)
+        return url, headers
+
+    def presign_upload_part(self, key: str, upload_id: str, part_number: int, size: int, expires_in: int) -> str:
+        # S3 checks sizes itself on completion; ``size`` matters to the local backend
+        return self.client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": self.bucket,
+                "Key": key,
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+                "ChecksumAlgorithm": self.part_checksum_algorithm,
+            },
+            ExpiresIn=expires_in,
+        )
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key, ChecksumMode="ENABLED")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        checksum = head.get("ChecksumSHA256")
+        # Multipart objects carry a checksum-of-part-checksums ("...-N"), not a whole-object one;
+        # their parts are verified individually instead (list_part_checksums)
+        if checksum and "-" in checksum:
+            checksum = None
+        return ObjectStat(head["ContentLength"], checksum)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+
+class LocalBackend:
+    """Content-addressed filesystem implementation of the same contract.
+
+    Object bytes live once per SHA-256 under ``blobs/<aa>/<digest>``; each
+    key is a small JSON ref under ``refs/`` naming its digest plus a hard link
+    to the blob next to it (``<ref>.blob``), so duplicate avatars and
+    thumbnails share one file and the blob's link count is its reference
+    count. Deleting the last key removes the blob; a key keeps its bytes
+    through its own link even if the shared entry goes meanwhile. Objects
+    written before blobs were reference counted stay under ``objects/`` and
+    are never removed. Every write lands in ``.tmp/`` first and is renamed
+    into place. Multipart parts are staged under ``.multipart/<upload_id>/``
+    as ``<part_number>.<md5>``. Presigned URLs point at the API's
+    ``PUT /uploads/local/{token}`` route and carry the size the body may
+    have, and objects are served by ``GET /files/{key}``.
+    """
+
+    # The whole-object digest is computed on completion, multipart or not
+    verifies_multipart_sha256 = True
+    part_checksum_algorithm: Optional[str] = None
+
+    def __init__(self, root: str, base_url: str) -> None:
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+        self.refs_root = os.path.join(self.root, "refs")
+        self.objects_root = os.path.join(self.root, "objects")
+        self.blobs_root = os.path.join(self.root, "blobs")
+        self.tmp_root = os.path.join(self.root, ".tmp")
+        self.slots = asyncio.Semaphore(settings.storage_max_concurrency)
+
+    def url_for(self, key: str) -> str:
+        return f"{self.base_url}/{key}"
+
+    def _ref_path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.refs_root, key))
+        if not path.startswith(self.refs_root + os.sep):
+            raise ValueError("invalid storage key")
+        return path
+
+    def _object_path(self, digest: str) -> str:
+        # Legacy (not reference counted) location
+        return os.path.join(self.objects_root, digest[:2], digest)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.blobs_root, digest[:2], digest)
+
+    def _read_ref(self, key: str) -> Optional[dict[str, Any]]:
+        try:
+            with open(self._ref_path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _release(self, digest: str) -> None:
+        """Remove the shared blob once no key links to it any more."""
+        blob = self._blob_path(digest)
+        with suppress(FileNotFoundError):
+            if os.stat(blob).st_nlink <= 1:
+                os.remove(blob)
+
+    def _staging_dir(self, upload_id: str) -> str:
+        return os.path.join(self.root, ".multipart", uuid.UUID(hex=upload_id).hex)
+
+    def tmp_path(self) -> str:
+        os.makedirs(self.tmp_root, exist_ok=True)
+        return os.path.join(self.tmp_root, uuid.uuid4().hex)
+
+    def _write_json(self, path: str, data: dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = self.tmp_path()
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def commit(self, key: str, tmp: str, digest: str, size: int, content_type: Optional[str]) -> None:
+        """Link ``key`` to the blob for ``digest``, storing ``tmp`` as that blob unless it exists."""
+        ref_path = self._ref_path(key)
+        previous = self._read_ref(key)
+        blob = self._blob_path(digest)
+        link = ref_path + ".blob"
+        os.makedirs(os.path.dirname(link), exist_ok=True)
+        with suppress(FileNotFoundError):
+            os.remove(link)
+        try:
+            os.link(blob, link)
+            os.remove(tmp)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.link(tmp, link)
+            os.replace(tmp, blob)
+        self._write_json(ref_path, {"sha256": digest, "size": size, "content_type": content_type})
+        if previous and previous["sha256"] != digest:
+            self._release(previous["sha256"])
+
+    def place_part(self, upload_id: str, part_number: int, tmp: str, etag: str) -> None:
+        staging = self._staging_dir(upload_id)
+        if not os.path.isdir(staging):
+            os.remove(tmp)
+            raise ValueError("unknown or finished multipart upload")
+        prefix = f"{part_number:05d}."
+        for name in os.listdir(staging):
+            if name.startswith(prefix):
+                os.remove(os.path.join(staging, name))
+        os.replace(tmp, os.path.join(staging, prefix + etag))
+
+    def resolve(self, key: str) -> Optional[tuple[str, dict[str, Any]]]:
+        """Object path and ref for ``key``, or None."""
+        ref = self._read_ref(key)
+        if ref is None:
+            return None
+        link = self._ref_path(key) + ".blob"
+        return (link if os.path.exists(link) else self._object_path(ref["sha256"])), ref
+
+    def put_object(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
+        tmp = self.tmp_path()
+        with open(tmp, "wb") as f:
+            f.write(data)
+        self.commit(key, tmp, hashlib.sha256(data).hexdigest(), len(data), content_type)
+
+    def create_multipart_upload(self, key: str, content_type: Optional[str] = None, part_checksums: bool = False) -> str:
+        upload_id = uuid.uuid4().hex
+        self._write_json(
+            os.path.join(self._staging_dir(upload_id), "upload.json"), {"key": key, "content_type": content_type}
+        )
+        return upload_id
+
+    def upload_part(self, key: str, upload_id: str, part_number: int, data: bytes) -> str:
+        etag = hashlib.md5(data).hexdigest()
+        tmp = self.tmp_path()
+        with open(tmp, "wb") as f:
+            f.write(data)
+        self.place_part(upload_id, part_number, tmp, etag)
+        return etag
+
+    def list_parts(self, key: str, upload_id: str) -> dict[int, str]:
+        parts: dict[int, str] = {}
+        for name in os.listdir(self._staging_dir(upload_id)):
+            number, _, etag = name.partition(".")
+            if number.isdigit():
+                parts[int(number)] = etag
+        return parts
+
+    def list_part_checksums(self, key: str, upload_id: str) -> Optional[dict[int, Optional[str]]]:
+        return None  # parts are hashed together on completion instead
+
+    def complete_multipart_upload(
+        self, key: str, upload_id: str, parts: dict[int, str], checksums: Optional[dict[int, str]] = None
+    ) -> None:
+        staging = self._staging_dir(upload_id)
+        with open(os.path.join(staging, "upload.json")) as f:
+            content_type = json.load(f).get("content_type")
+        digest = hashlib.sha256()
+        size = 0
+        tmp = self.tmp_path()
+        with open(tmp, "wb") as out:
+            for n in sorted(parts):
+                with open(os.path.join(staging, f"{n:05d}.{parts[n].strip(chr(34))}"), "rb") as part:
+                    while chunk := part.read(1024 * 1024):
+                        digest.update(chunk)
+                        size += len(chunk)
+                        out.write(chunk)
+        self.commit(key, tmp, digest.hexdigest(), size, content_type)
+        shutil.rmtree(staging, ignore_errors=True)
+
+    def abort_multipart_upload(self, key: str, upload_id: str) -> None:
+        shutil.rmtree(self._staging_dir(upload_id), ignore_errors=True)
+
+    def _presign(self, claims: dict[str, Any], expires_in: int) -> str:
+        token = key_ring.sign({"typ": "local-put", "exp": int(time.time()) + expires_in, **claims})
+        return f"{settings.local_storage_upload_url.rstrip('/')}/{token}"
+
+    def presign_put(
+        self, key: str, size: int, content_type: Optional[str], checksum_sha256: Optional[str], expires_in: int
+    ) -> tuple[str, dict[str, str]]:
+        headers = {"Content-Type": content_type} if content_type else {}
+        return self._presign({"key": key, "size": size, "content_type": content_type}, expires_in), headers
+
+    def presign_upload_part(self, key: str, upload_id: str, part_number: int, size: int, expires_in: int) -> str:
+        return self._presign(
+            {"key": key, "upload_id": upload_id, "part_number": part_number, "size": size}, expires_in
+        )
+
+    def stat(self, key: str) -> Optional[ObjectStat]:
+        resolved = self.resolve(key)
+        if resolved is None:
+            return None
+        _, ref = resolved
+        # The digest is the object's address, so no re-read is needed
+        return ObjectStat(ref["size"], base64.b64encode(bytes.fromhex(ref["sha256"])).decode())
+
+    def delete(self, key: str) -> None:
+        # The blob goes with its last key
+        ref = self._read_ref(key)
+        if ref is None:
+            return
+        ref_path = self._ref_path(key)
+        with suppress(FileNotFoundError):
+            os.remove(ref_path + ".blob")
+        with suppress(FileNotFoundError):
+            os.remove(ref_path)
+        self._release(ref["sha256"])
+
+
+class MultipartUpload:
+    """Parts confirmed so far, so a failed part is retried without resending the others."""
+
+    def __init__(self, key: str, upload_id: str) -> None:
+        self.key = key
+        self.upload_id = upload_id
+        self.parts: dict[int, str] = {}
 
 
 class StorageService:
+    """Async front for the configured backend.
+
+    Blocking backend calls (boto3, file I/O) run on a dedicated executor of
+    ``storage_io_workers`` threads, never on the event loop or the shared
+    AnyIO threadpool that sync routes use, and at most
+    ``storage_max_concurrency`` of them are in flight per backend. Slow
+    storage therefore queues storage work only.
+    """
+
     def __init__(self) -> None:
         self.bucket = settings.aws_s3_bucket
         self.enabled = bool(self.bucket and settings.aws_access_key_id and settings.aws_secret_access_key)
         if self.enabled:
-            self.client = boto3.client(
-                "s3",
-                aws_access_key_id=settings.aws_access_key_id,
-                aws_secret_access_key=settings.aws_secret_access_key,
-                config=BotoConfig(s3={"addressing_style": "virtual"}),
+            self.backend = S3Backend(self.bucket)
+        else:
+            self.backend = LocalBackend(settings.local_storage_dir, settings.local_storage_base_url)
+        self.uploads: dict[str, MultipartUpload] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=settings.storage_io_workers, thread_name_prefix="storage-io"
+            )
+        return self._executor
+
+    def shutdown(self) -> None:
+        """Wait for in-flight storage calls; blocking, so call it off the event loop."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking backend call on the storage executor under the backend's cap."""
+        async with self.backend.slots:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(fn, *args, **kwargs)
+            )
+
+    @staticmethod
+    def new_key(key_prefix: str) -> str:
+        return f"{key_prefix}/{uuid.uuid4().hex}"
+
+    async def upload_bytes(self, data: bytes, key_prefix: str, content_type: Optional[str] = None) -> str:
+        key = self.new_key(key_prefix)
+        await self.run(self.backend.put_object, key, data, content_type)
+        return self.backend.url_for(key)
+
+    async def upload_stream(
+        self,
+        file: UploadFile,
+        key_prefix: str,
+        content_type: Optional[str] = None,
+        allow_empty: bool = True,
+    ) -> str:
+        """Upload ``file`` in ``storage_part_size`` parts without reading it whole.
+
+        Up to ``storage_upload_concurrency`` parts are in flight at once, so
+        memory per upload stays around part size x concurrency. A file that
+        fits in a single part is sent with one plain put.
+        """
+        part_size = settings.storage_part_size
+        key = self.new_key(key_prefix)
+
+        first = await file.read(part_size)
+        if not first and not allow_empty:
+            raise EmptyUpload("Empty file")
+        second = await file.read(part_size) if len(first) == part_size else b""
+        if not second:
+            await self.run(self.backend.put_object, key, first, content_type)
+            return self.backend.url_for(key)
+
+        async def parts() -> AsyncIterator[bytes]:
+            yield first
+            yield second
+            while chunk := await file.read(part_size):
+                yield chunk
+
+        upload_id = await self.run(self.backend.create_multipart_upload, key, content_type)
+        upload = self.uploads[upload_id] = MultipartUpload(key, upload_id)
+        slots = asyncio.Semaphore(settings.storage_upload_concurrency)
+        tasks: list[asyncio.Task] = []
+        try:
+            part_number = 0
+            async for data in parts():
+                await slots.acquire()
+                part_number += 1
+                tasks.append(asyncio.create_task(self._upload_part(upload, part_number, data, slots)))
+                failed = next((t for t in tasks if t.done() and t.exception()), None)
+                if failed:
+                    failed.result()
+            await asyncio.gather(*tasks)
+            # Reconcile against what the backend actually holds before completing
+            if len(upload.parts) != part_number:
+                upload.parts.update(await self.run(self.backend.list_parts, key, upload_id))
+            await self.run(self.backend.complete_multipart_upload, key, upload_id, upload.parts)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.run(self.backend.abort_multipart_upload, key, upload_id)
+            raise
+        finally:
+            self.uploads.pop(upload_id, None)
+        return self.backend.url_for(key)
+
+    async def presign_upload(
+        self,
+        key_prefix: str,
+        size: int,
+        content_type: Optional[str] = None,
+        checksum_sha256: Optional[str] = None,
+        **claims: Any,
+    ) -> dict[str, Any]:
+        return await self.run(self._presign_upload, key_prefix, size, content_type, checksum_sha256, **claims)
+
+    def _presign_upload(
+        self,
+        key_prefix: str,
+        size: int,
+        content_type: Optional[str] = None,
+        checksum_sha256: Optional[str] = None,
+        **claims: Any,
+    ) -> dict[str, Any]:
+        """Start a direct-to-storage upload and return what the client needs for it.
+
+        Objects up to ``storage_part_size`` get one presigned PUT; larger ones a
+        multipart upload with a presigned URL per part, each of which must carry
+        its own checksum where the backend asks for one (``part_checksum``). A
+        whole-object checksum is refused for multipart uploads the backend
+        cannot verify it on. The returned ``ticket`` signs the key, expected
+        size and checksum plus ``claims``, and is handed back to
+        :meth:`complete_presigned_upload`.
+        """
+        expires_in = settings.storage_presign_expires_seconds
+        expires_at = int(time.time()) + expires_in
+        key = self.new_key(key_prefix)
+        ticket = {"typ": "upload", "key": key, "size": size, "sha256": checksum_sha256, "exp": expires_at, **claims}
+        result: dict[str, Any] = {
+            "key": key,
+            "method": "PUT",
+            "url": None,
+            "headers": {},
+            "upload_id": None,
+            "part_size": None,
+            "part_checksum": None,
+            "parts": [],
+            "expires_at": datetime.fromtimestamp(expires_at, tz=timezone.utc),
+        }
+        if size <= settings.storage_part_size:
+            result["url"], result["headers"] = self.backend.presign_put(
+                key, size, content_type, checksum_sha256, expires_in
             )
         else:
-            self.client = None
-
-    def upload_bytes(self, data: bytes, key_prefix: str, content_type: Optional[str] = None) -> str:
-        key = f"{key_prefix}/{uuid.uuid4().hex}"
-        if self.enabled and self.client:
-            extra = {"ContentType": content_type} if content_type else None
-            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **(extra or {}))
-            return f"https://{self.bucket}.s3.amazonaws.com/{key}"
-        # Fallback: pretend uploaded and return pseudo URL
-        return f"https://example.local/{key}"
+            part_size = max(settings.storage_part_size, -(-size // settings.storage_max_parts))
+            part_count = -(-size // part_size)
+            if checksum_sha256 and not self.backend.verifies_multipart_sha256:
+                raise UploadVerificationError(
+                    "checksum_sha256 cannot be verified for multipart uploads; send a checksum with each part instead"
+                )
+            upload_id = self.backend.create_multipart_upload(key, content_type, part_checksums=True)
+            result["upload_id"] = upload_id
+            result["part_size"] = part_size
+            result["part_checksum"] = self.backend.part_checksum_algorithm
+            result["parts"] = [
+                {
+                    "part_number": n,
+                    "url": self.backend.presign_upload_part(
+                        key, upload_id, n, min(part_size, size - (n - 1) * part_size), expires_in
+                    ),
+                }
+                for n in range(1, part_count + 1)
+            ]
+            ticket["upload_id"] = upload_id
+            ticket["parts"] = part_count
+        result["ticket"] = key_ring.sign(ticket)
+        return result
+
+    async def complete_presigned_upload(
+        self, ticket: str, parts: Optional[dict[int, str]] = None, **expected: Any
+    ) -> tuple[str, int]:
+        return await self.run(self._complete_presigned_upload, ticket, parts, **expected)
+
+    def _complete_presigned_upload(
+        self, ticket: str, parts: Optional[dict[int, str]] = None, **expected: Any
+    ) -> tuple[str, int]:
+        """Finish a presigned upload and verify the stored object; returns (url, size).
+
+        ``expected`` claims must match the ticket (e.g. the course or user it
+        was issued for). For multipart uploads the part ETags the client
+        reports must match what storage holds, and on backends that check
+        per-part checksums every part must have been sent with one. The
+        object's size, and its SHA-256 where the backend records a
+        whole-object checksum, must match what was declared; otherwise the
+        object is deleted.
+        """
+        claims = key_ring.verify(ticket)
+        if claims.get("typ") != "upload":
+            raise UploadVerificationError("not an upload ticket")
+        for name, value in expected.items():
+            if claims.get(name) != value:
+                raise UploadVerificationError("upload ticket was issued for a different target")
+        key = claims["key"]
+
+        upload_id = claims.get("upload_id")
+        if upload_id:
+            stored = self.backend.list_parts(key, upload_id)
+            missing = [n for n in range(1, claims["parts"] + 1) if n not in stored]
+            if missing:
+                raise UploadVerificationError(f"parts not uploaded: {missing[:10]}")
+            for n, etag in (parts or {}).items():
+                if stored.get(n, "").strip('"') != etag.strip('"'):
+                    raise UploadVerificationError(f"ETag mismatch for part {n}")
+            numbers = range(1, claims["parts"] + 1)
+            checksums = self.backend.list_part_checksums(key, upload_id)
+            if checksums is not None:
+                unchecked = [n for n in numbers if not checksums.get(n)]
+                if unchecked:
+                    raise UploadVerificationError(f"parts uploaded without a checksum: {unchecked[:10]}")
+            self.backend.complete_multipart_upload(
+                key,
+                upload_id,
+                {n: stored[n] for n in numbers},
+                {n: checksums[n] for n in numbers} if checksums is not None else None,
+            )
+
+        stat = self.backend.stat(key)
+        if stat is None:
+            raise UploadVerificationError("uploaded object not found")
+        declared = claims.get("sha256")
+        if stat.size != claims["size"]:
+            self.backend.delete(key)
+            raise UploadVerificationError(f"size mismatch: expected {claims['size']}, stored {stat.size}")
+        if declared and stat.checksum_sha256 and stat.checksum_sha256 != declared:
+            self.backend.delete(key)
+            raise UploadVerificationError("checksum mismatch")
+        return self.backend.url_for(key), stat.size
+
+    async def _upload_part(self, upload: MultipartUpload, part_number: int, data: bytes, slots: asyncio.Semaphore) -> None:
+        try:
+            retries = settings.storage_part_retries
+            for attempt in range(retries + 1):
+                try:
+                    upload.parts[part_number] = await self.run(
+                        self.backend.upload_part, upload.key, upload.upload_id, part_number, data
+                    )
+                    return
+                except Exception:
+                    if attempt == retries:
+                        raise
+                    await asyncio.sleep(0.2 * 2 ** attempt)
+        finally:
+            slots.release()
+
+    async def resolve_local(self, key: str) -> Optional[tuple[str, dict[str, Any]]]:
+        """Object path and ref for ``key`` when the filesystem backend is active."""
+        if not isinstance(self.backend, LocalBackend):
+            return None
+        try:
+            return await self.run(self.backend.resolve, key)
+        except ValueError:
+            return None
+
+    async def receive_local_put(self, claims: dict[str, Any], chunks: AsyncIterator[bytes]) -> str:
+        """Store a presigned local PUT body for verified ``claims``; returns its MD5 ETag.
+
+        The body is written one chunk at a time on the storage executor, so it
+        never sits in memory whole, and is refused once it grows past the
+        size signed into the URL.
+        """
+        backend = self.backend
+        if not isinstance(backend, LocalBackend):
+            raise ValueError("local uploads are not enabled")
+        limit = claims.get("size")
+        if limit is None:
+            raise ValueError("upload URL does not declare a size")
+        tmp = await self.run(backend.tmp_path)
+        sha256, md5, size = hashlib.sha256(), hashlib.md5(), 0
+        f = await self.run(open, tmp, "wb")
+        try:
+            async for chunk in chunks:
+                sha256.update(chunk)
+                md5.update(chunk)
+                size += len(chunk)
+                if size > limit:
+                    raise ValueError(f"body larger than the declared {limit} bytes")
+                await self.run(f.write, chunk)
+            await self.run(f.close)
+            if claims.get("upload_id"):
+                await self.run(backend.place_part, claims["upload_id"], int(claims["part_number"]), tmp, md5.hexdigest())
+            else:
+                await self.run(backend.commit, claims["key"], tmp, sha256.hexdigest(), size, claims.get("content_type"))
+        except BaseException:
+            f.close()
+            with suppress(FileNotFoundError):
+                os.remove(tmp)
+            raise
+        return md5.hexdigest()
 
 
 storage_service = StorageService()
@@ -0,0 +1,48 @@
+import hashlib
+import logging
+
+from sqlalchemy import delete, func, select
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.models.token import PasswordResetToken, RevokedToken
+
+logger = logging.getLogger(__name__)
+
+
+def hash_token(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+async def purge_expired_tokens() -> int:
+    """Delete expired issued/revoked token rows in small batches, committing between batches.
+
+    Each batch locks only the rows it deletes (SKIP LOCKED lets several
+    workers purge at once), so the table is never locked for long.
+    """
+    batch_size = settings.token_purge_batch_size
+    total = 0
+    async with AsyncSessionLocal() as db:
+        for key, expires_at in (
+            (PasswordResetToken.id, PasswordResetToken.expires_at),
+            (RevokedToken.jti, RevokedToken.expires_at),
+        ):
+            while True:
+                expired = (
+                    select(key)
+                    .where(expires_at < func.now())
+                    .limit(batch_size)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                result = await db.execute(
+                    delete(key.class_).where(key.in_(expired)),
+                    execution_options={"synchronize_session": False},
+                )
+                await db.commit()
+                total += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+    if total:
+        logger.info("purged %d expired tokens", total)
+    return total
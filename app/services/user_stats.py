@@ -0,0 +1,244 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import Date, Integer, case, cast, delete, distinct, exists, func, select, union, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.course import UserCourseProgress, UserVideoProgress
+from app.models.quiz import UserQuizAttempt
+from app.models.user import User, UserStats
+from app.schemas.user import UserStatsOut
+
+COUNTERS = (
+    "courses_started",
+    "courses_completed",
+    "total_watch_seconds",
+    "quiz_attempts",
+    "quizzes_passed",
+    "score_total",
+)
+
+
+def stats_delta(user_id: int, active_at: datetime, **counters) -> dict:
+    """One user's increments plus the UTC day the activity happened on."""
+    row = dict.fromkeys(COUNTERS, 0)
+    row.update(counters)
+    row["user_id"] = user_id
+    row["last_active_on"] = active_at.astimezone(timezone.utc).date()
+    return row
+
+
+def course_progress_deltas(changes: Iterable) -> list[dict]:
+    """Deltas for rows returned by ``upsert_course_progress_tracked``."""
+    return [
+        stats_delta(
+            c.user_id,
+            c.last_accessed_at,
+            courses_started=int(c.started),
+            courses_completed=int(c.completed),
+        )
+        for c in changes
+    ]
+
+
+def quiz_attempt_delta(user_id: int, quiz_id: int, attempt_id: int, score: int, is_passed: bool, at: datetime) -> dict:
+    """Delta for a stored attempt; a quiz counts as passed only on its first passing attempt.
+
+    Must run after the attempt is written, in the same transaction.
+    """
+    first_pass = 0
+    if is_passed:
+        passed_before = exists().where(
+            UserQuizAttempt.user_id == user_id,
+            UserQuizAttempt.quiz_id == quiz_id,
+            UserQuizAttempt.is_passed,
+            UserQuizAttempt.id != attempt_id,
+        )
+        first_pass = case((passed_before, 0), else_=1)
+    return stats_delta(user_id, at, quiz_attempts=1, quizzes_passed=first_pass, score_total=score)
+
+
+def forget_quiz_passes_stmt(quiz_id: int):
+    """Drop a quiz from ``quizzes_passed`` of everyone who passed it; run before deleting the quiz.
+
+    Its attempts stay (with quiz_id set to NULL) and keep counting towards
+    ``quiz_attempts`` and ``score_total``, as they do in ``rebuild_user_stats``.
+    """
+    passed_by = select(UserQuizAttempt.user_id).where(UserQuizAttempt.quiz_id == quiz_id, UserQuizAttempt.is_passed)
+    return (
+        update(UserStats)
+        .where(UserStats.user_id.in_(passed_by))
+        .values(quizzes_passed=func.greatest(UserStats.quizzes_passed - 1, 0), updated_at=func.now())
+    )
+
+
+def upsert_user_stats_stmt(rows: list[dict]):
+    """INSERT ... ON CONFLICT (user_id) DO UPDATE adding each row's counters.
+
+    The streak grows when activity lands on the day after ``last_active_on``,
+    is kept for the same (or an earlier) day and restarts at 1 after a gap.
+    """
+    stmt = insert(UserStats).values(
+        [{**row, "current_streak_days": 1, "longest_streak_days": 1} for row in rows]
+    )
+    excluded = stmt.excluded
+    streak = case(
+        (UserStats.last_active_on.is_(None), 1),
+        (UserStats.last_active_on >= excluded.last_active_on, UserStats.current_streak_days),
+        ((excluded.last_active_on - UserStats.last_active_on) == 1, UserStats.current_streak_days + 1),
+        else_=1,
+    )
+    set_ = {name: getattr(UserStats, name) + getattr(excluded, name) for name in COUNTERS}
+    set_.update(
+        current_streak_days=streak,
+        longest_streak_days=func.greatest(UserStats.longest_streak_days, streak),
+        last_active_on=func.greatest(UserStats.last_active_on, excluded.last_active_on),
+        updated_at=func.now(),
+    )
+    return stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=set_)
+
+
+async def apply_stats_deltas(db: AsyncSession, deltas: Iterable[dict]) -> None:
+    """Fold deltas per user and upsert them in the caller's transaction."""
+    merged: dict[int, dict] = {}
+    for delta in deltas:
+        current = merged.get(delta["user_id"])
+        if current is None:
+            merged[delta["user_id"]] = dict(delta)
+            continue
+        for name in COUNTERS:
+            current[name] = current[name] + delta[name]
+        current["last_active_on"] = max(current["last_active_on"], delta["last_active_on"])
+    if merged:
+        # ON CONFLICT may touch each user once per statement, hence the merge above
+        await db.execute(upsert_user_stats_stmt(list(merged.values())))
+
+
+def stats_out(stats: Optional[UserStats], today: Optional[date] = None) -> UserStatsOut:
+    if stats is None:
+        return UserStatsOut()
+    today = today or datetime.now(timezone.utc).date()
+    streak_alive = stats.last_active_on is not None and stats.last_active_on >= today - timedelta(days=1)
+    return UserStatsOut(
+        courses_started=stats.courses_started,
+        courses_completed=stats.courses_completed,
+        total_watch_seconds=stats.total_watch_seconds,
+        quiz_attempts=stats.quiz_attempts,
+        quizzes_passed=stats.quizzes_passed,
+        average_score=round(stats.score_total / stats.quiz_attempts, 2) if stats.quiz_attempts else None,
+        current_streak_days=stats.current_streak_days if streak_alive else 0,
+        longest_streak_days=stats.longest_streak_days,
+        last_active_on=stats.last_active_on,
+    )
+
+
+def _activity_days():
+    """Distinct (user_id, UTC day) pairs from every timestamp the source tables keep.
+
+    Only the latest access per course/video survives in those tables, so a
+    rebuilt streak can be shorter than the incrementally maintained one.
+    """
+    sources = (
+        UserCourseProgress.started_at,
+        UserCourseProgress.last_accessed_at,
+        UserCourseProgress.completed_at,
+        UserVideoProgress.last_watched_at,
+        UserQuizAttempt.completed_at,
+    )
+    return union(
+        *(
+            select(
+                col.class_.user_id.label("user_id"),
+                cast(func.timezone("UTC", col), Date).label("day"),
+            ).where(col.is_not(None))
+            for col in sources
+        )
+    ).subquery("days")
+
+
+def rebuild_user_stats_stmt():
+    courses = (
+        select(
+            UserCourseProgress.user_id,
+            func.count().label("courses_started"),
+            func.count(UserCourseProgress.completed_at).label("courses_completed"),
+        )
+        .group_by(UserCourseProgress.user_id)
+        .subquery("course_totals")
+    )
+    watched = (
+        select(UserVideoProgress.user_id, func.sum(UserVideoProgress.watched_seconds).label("total_watch_seconds"))
+        .group_by(UserVideoProgress.user_id)
+        .subquery("watch_totals")
+    )
+    quizzes = (
+        select(
+            UserQuizAttempt.user_id,
+            func.count().label("quiz_attempts"),
+            func.count(distinct(UserQuizAttempt.quiz_id)).filter(UserQuizAttempt.is_passed).label("quizzes_passed"),
+            func.sum(UserQuizAttempt.score).label("score_total"),
+        )
+        .group_by(UserQuizAttempt.user_id)
+        .subquery("quiz_totals")
+    )
+    # Gaps and islands: consecutive days share day - row_number()
+    days = _activity_days()
+    islands = select(
+        days.c.user_id,
+        days.c.day,
+        (
+            days.c.day
+            - cast(func.row_number().over(partition_by=days.c.user_id, order_by=days.c.day), Integer)
+        ).label("island"),
+    ).subquery("islands")
+    runs = (
+        select(
+            islands.c.user_id,
+            func.count().label("length"),
+            func.max(islands.c.day).label("ended_on"),
+            func.max(func.max(islands.c.day)).over(partition_by=islands.c.user_id).label("last_active_on"),
+        )
+        .group_by(islands.c.user_id, islands.c.island)
+        .subquery("runs")
+    )
+    streaks = (
+        select(
+            runs.c.user_id,
+            func.max(runs.c.length).filter(runs.c.ended_on == runs.c.last_active_on).label("current_streak_days"),
+            func.max(runs.c.length).label("longest_streak_days"),
+            func.max(runs.c.last_active_on).label("last_active_on"),
+        )
+        .group_by(runs.c.user_id)
+        .subquery("streaks")
+    )
+    source = (
+        select(
+            User.id,
+            func.coalesce(courses.c.courses_started, 0),
+            func.coalesce(courses.c.courses_completed, 0),
+            func.coalesce(watched.c.total_watch_seconds, 0),
+            func.coalesce(quizzes.c.quiz_attempts, 0),
+            func.coalesce(quizzes.c.quizzes_passed, 0),
+            func.coalesce(quizzes.c.score_total, 0),
+            func.coalesce(streaks.c.current_streak_days, 0),
+            func.coalesce(streaks.c.longest_streak_days, 0),
+            streaks.c.last_active_on,
+        )
+        .outerjoin(courses, courses.c.user_id == User.id)
+        .outerjoin(watched, watched.c.user_id == User.id)
+        .outerjoin(quizzes, quizzes.c.user_id == User.id)
+        .outerjoin(streaks, streaks.c.user_id == User.id)
+    )
+    return insert(UserStats).from_select(
+        ["user_id", *COUNTERS, "current_streak_days", "longest_streak_days", "last_active_on"], source
+    )
+
+
+def rebuild_user_stats(db: Session) -> int:
+    """Recompute every user's row from the source tables in one transaction (backfill / repair)."""
+    db.execute(delete(UserStats))
+    count = db.execute(rebuild_user_stats_stmt()).rowcount
+    db.commit()
+    return count
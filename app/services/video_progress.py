@@ -0,0 +1,144 @@
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import Boolean, DateTime, Integer, and_, case, column, func, literal, literal_column, select, true, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.course import CourseVideo, UserVideoProgress
+from app.schemas.course import VideoHeartbeatEventIn
+from app.services.progress_buffer import INSERTED
+
+
+class FoldedVideo:
+    __slots__ = ("video_id", "watched_seconds", "position_seconds", "is_completed", "last_watched_at")
+
+    def __init__(self, video_id: int, last_watched_at: datetime):
+        self.video_id = video_id
+        # Seconds watched in this batch, added to the stored total on upsert
+        self.watched_seconds = 0
+        self.position_seconds = 0
+        self.is_completed = False
+        self.last_watched_at = last_watched_at
+
+
+def fold_events(events: Iterable[VideoHeartbeatEventIn]) -> list[FoldedVideo]:
+    """Collapse a batch to one row per video.
+
+    Watched deltas add up, completion sticks, and the resume position comes
+    from the latest event (by ``occurred_at``, then batch order).
+    """
+    now = datetime.now(timezone.utc)
+    folded: dict[int, FoldedVideo] = {}
+    for event in sorted(events, key=lambda e: e.occurred_at or now):
+        at = event.occurred_at or now
+        video = folded.get(event.video_id)
+        if video is None:
+            video = folded[event.video_id] = FoldedVideo(event.video_id, at)
+        video.watched_seconds += event.watched_delta_seconds
+        video.position_seconds = event.position_seconds
+        video.is_completed = video.is_completed or event.completed
+        video.last_watched_at = max(video.last_watched_at, at)
+    return list(folded.values())
+
+
+async def upsert_video_progress(db: AsyncSession, user_id: int, course_id: int, videos: list[FoldedVideo]) -> list:
+    """Fold a batch into user_video_progress with one INSERT ... SELECT ... ON CONFLICT.
+
+    Rows are joined against course_videos, so IDs outside the course are
+    dropped, and watched time is capped at the video's duration. Returns the
+    stored rows for the videos that were accepted, each with the
+    ``added_seconds`` it gained.
+    """
+    if not videos:
+        return []
+    batch = values(
+        column("video_id", Integer),
+        column("watched_seconds", Integer),
+        column("position_seconds", Integer),
+        column("is_completed", Boolean),
+        column("last_watched_at", DateTime(timezone=True)),
+        name="heartbeats",
+    ).data([
+        (v.video_id, v.watched_seconds, v.position_seconds, v.is_completed, v.last_watched_at) for v in videos
+    ])
+    source = (
+        select(
+            literal(user_id),
+            batch.c.video_id,
+            func.least(batch.c.watched_seconds, CourseVideo.duration_seconds),
+            batch.c.position_seconds,
+            batch.c.is_completed,
+            batch.c.last_watched_at,
+        )
+        .select_from(batch)
+        .join(CourseVideo, and_(CourseVideo.id == batch.c.video_id, CourseVideo.course_id == course_id))
+        # WHERE keeps Postgres from reading ON CONFLICT as part of the join
+        .where(true())
+    )
+    stmt = insert(UserVideoProgress).from_select(
+        ["user_id", "video_id", "watched_seconds", "position_seconds", "is_completed", "last_watched_at"], source
+    )
+    # Correlated on the conflicting row; a literal so SQLAlchemy does not add
+    # ``excluded`` to the subquery's FROM list
+    duration = (
+        select(CourseVideo.duration_seconds)
+        .where(CourseVideo.id == literal_column("excluded.video_id"))
+        .scalar_subquery()
+    )
+    upserted = stmt.on_conflict_do_update(
+        index_elements=[UserVideoProgress.user_id, UserVideoProgress.video_id],
+        set_={
+            "watched_seconds": func.least(UserVideoProgress.watched_seconds + stmt.excluded.watched_seconds, duration),
+            "position_seconds": case(
+                (
+                    stmt.excluded.last_watched_at >= func.coalesce(UserVideoProgress.last_watched_at, stmt.excluded.last_watched_at),
+                    stmt.excluded.position_seconds,
+                ),
+                else_=UserVideoProgress.position_seconds,
+            ),
+            "is_completed": UserVideoProgress.is_completed | stmt.excluded.is_completed,
+            "last_watched_at": func.greatest(UserVideoProgress.last_watched_at, stmt.excluded.last_watched_at),
+            "updated_at": func.now(),
+        },
+    ).returning(
+        UserVideoProgress.video_id,
+        UserVideoProgress.watched_seconds,
+        UserVideoProgress.position_seconds,
+        UserVideoProgress.is_completed,
+        INSERTED,
+    ).cte("upserted")
+    # An inserted row gained all of its seconds; an updated one gained the
+    # difference to its total in the statement snapshot. A row inserted
+    # concurrently is missing from that snapshot and counts 0 (the drift
+    # rebuild-user-stats corrects), never the other writer's seconds again.
+    prior = (
+        select(UserVideoProgress.video_id, UserVideoProgress.watched_seconds)
+        .where(UserVideoProgress.user_id == user_id, UserVideoProgress.video_id.in_([v.video_id for v in videos]))
+        .cte("prior")
+    )
+    added = case(
+        (upserted.c.inserted, upserted.c.watched_seconds),
+        else_=upserted.c.watched_seconds - func.coalesce(prior.c.watched_seconds, upserted.c.watched_seconds),
+    )
+    return (
+        await db.execute(
+            select(*(c for c in upserted.c if c.name != "inserted"), added.label("added_seconds")).outerjoin(
+                prior, prior.c.video_id == upserted.c.video_id
+            )
+        )
+    ).all()
+
+
+async def course_watched_seconds(db: AsyncSession, user_id: int, course_id: int) -> int:
+    """Seconds of the course the user has watched; completed videos count in full."""
+    watched = case(
+        (UserVideoProgress.is_completed, CourseVideo.duration_seconds),
+        else_=func.least(UserVideoProgress.watched_seconds, CourseVideo.duration_seconds),
+    )
+    return await db.scalar(
+        select(func.coalesce(func.sum(watched), 0))
+        .select_from(UserVideoProgress)
+        .join(CourseVideo, CourseVideo.id == UserVideoProgress.video_id)
+        .where(UserVideoProgress.user_id == user_id, CourseVideo.course_id == course_id)
+    ) or 0